@@ -1,15 +1,28 @@
-from openai import OpenAI
 import json
-from typing import Any
-import re
 import asyncio
 import aiofiles
 import os
+import sys
+from collections import Counter
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Add parent directory to path to import from src.llm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.llm import get_gpt, cache, MODEL
+from src.manifest import RunManifest, manifest_path, chunk_id, content_hash, chunk_documents, item_key, STATUS_DONE, STATUS_EMPTY, STATUS_FAILED
+from src.scheduler import run_sliding_window
+from src.json_repair import parse_json
+from src.jsonl_writer import JsonlWriter
+from src.chunking import pack_items
+from src.ratelimit import CHARS_PER_TOKEN
+from src.ingest import read_records, records_path
+from src.corpus import CorpusStore, CORPUS_PATH
+from src.prefilter import RelevanceFilter
+
 def create_fact_prompt(source_items):
 	prompt = f"""
 	ROLE
@@ -113,129 +126,85 @@ def create_fact_prompt(source_items):
 	"""
 	return prompt
 
-def parse_json(completion: str) -> dict[str, Any] | None:
-	"""
-	Parse an LLM completion into a dict.
-	Tries multiple strategies to be robust against bad JSON.
-	"""
-	try:
-		parsed = json.loads(completion)
-		return parsed
-	except:
-		m = re.search(r"(\{.*\}|\[.*\])", completion, flags=re.DOTALL)
-		candidate = m.group(1) if m else completion
-
-		for attempt in [candidate, re.sub(r",(\s*[\]\}])", r"\1", candidate)]:
-			try:
-				parsed = json.loads(attempt)
-				return parsed
-			except json.JSONDecodeError:
-				continue
-		return None
-
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-async def get_gpt(prompt):
-	try:
-		# Run the synchronous OpenAI call in an executor to avoid blocking
-		loop = asyncio.get_event_loop()
-		response = await loop.run_in_executor(
-			None,
-			lambda: client.responses.create(
-				model="gpt-5.2",
-				input=prompt
-			)
-		)
-		return response.output_text
-	except:
-		return None
 
 async def get_facts(source_items):
 	prompt = create_fact_prompt(source_items)
 	try:
 		fact_res = await get_gpt(prompt)
 		facts = parse_json(fact_res)
-		return facts
 	except:
-		return {}
+		facts = None
+	if not isinstance(facts, dict):
+		# Do not replay an unusable response on the next run
+		cache.invalidate(MODEL, prompt)
+	return facts
 
 async def get_all_facts():
-	data = []
-	with open("all_res.json", "r") as f:
-		data = json.load(f)
+	if os.path.exists(CORPUS_PATH):
+		corpus = CorpusStore(CORPUS_PATH)
+		data = list(corpus.iter_documents(types=("web", "pdf", "youtube")))
+		corpus.close()
+	else:
+		data = list(read_records(records_path("all_res.jsonl")))
 	parallel = 24
 
-	# Create chunks based on character limits (3-10 items, max 85k chars)
-	chunks = []
-	idx = 0
-
-	while idx < len(data):
-		current_chunk = []
-
-		# Try to add 3-10 items, respecting the 85k character limit
-		while idx < len(data) and len(current_chunk) < 10:
-			test_chunk = current_chunk + [data[idx]]
-			test_str = json.dumps(test_chunk)
-
-			if len(test_str) < 85000:
-				current_chunk.append(data[idx])
-				idx += 1
-			else:
-				# Can't add this item without exceeding limit
-				if len(current_chunk) >= 3:
-					# We have enough items, break
-					break
-				elif len(current_chunk) > 0:
-					# We have 1-2 items, but can't add more
-					# Save what we have and move on
-					break
-				else:
-					# Edge case: single item is >= 85k
-					# Add it anyway
-					current_chunk.append(data[idx])
-					idx += 1
-					break
-
-		if current_chunk:
-			chunks.append(current_chunk)
-
-	# Lock for file writing
-	write_lock = asyncio.Lock()
+	# Drop documents about namesakes before any prompt is built for them
+	relevance = RelevanceFilter()
+	data = relevance.filter(data)
+	relevance.write_report("facts3.prefilter.json")
+
+	# Only documents that are new or changed since they were last analysed are
+	# scheduled; their facts are appended to facts3.jsonl, and
+	# manifest.current_lines() skips the lines they supersede
+	manifest = RunManifest(manifest_path("facts3.jsonl"))
+	# Documents the pre-filter now rejects no longer belong in facts3.jsonl
+	manifest.retire(manifest.document_keys(rejected["url"] for rejected in relevance.rejected))
+	statuses = [manifest.document_status(item) for item in data]
+	print(f"Documents: {dict(Counter(statuses))}")
+	# Unchanged documents that share a line with a changed one are redone with it
+	redo = manifest.companions([item_key(item) for item, status in zip(data, statuses) if status == "changed"])
+	data = [item for item, status in zip(data, statuses) if status != "unchanged" or item_key(item) in redo]
+
+	# Pack items into chunks of at most 10 items and ~85k characters of JSON,
+	# measuring each item once and filling chunks largest-first
+	chunks = pack_items(data, max_tokens=85000 // CHARS_PER_TOKEN, max_items=10, strategy="ffd")
+	print(f"Packed {len(data)} items into {len(chunks)} chunks")
 
 	# Track progress
 	total_chunks = len(chunks)
 	total_items = len(data)
 	processed_items = 0
 
-	async def process_and_write_chunk(chunk):
+	async def process_and_write_chunk(chunk, chunk_index):
 		nonlocal processed_items
 		result = await get_facts(chunk)
 
-		# Write to facts.jsonl with lock
-		async with write_lock:
-			loop = asyncio.get_event_loop()
-			await loop.run_in_executor(
-				None,
-				lambda: write_result(result)
-			)
-			processed_items += len(chunk)
-			print(f"Processed {processed_items}/{total_items} items ({len(chunk)} in this batch)")
+		# Hand the result to the single writer task for facts3.jsonl, then
+		# record the chunk so its documents are skipped next time
+		if result and isinstance(result, dict) and len(result.get("facts", [])):
+			await writer.write({**result, "chunk_id": chunk_id(chunk), "content_hash": content_hash(chunk), "documents": chunk_documents(chunk)})
+			manifest.record(chunk, STATUS_DONE, facts=len(result["facts"]))
+		elif isinstance(result, dict):
+			manifest.record(chunk, STATUS_EMPTY)
+		else:
+			manifest.record(chunk, STATUS_FAILED)
+		processed_items += len(chunk)
+		print(f"Processed {processed_items}/{total_items} items ({len(chunk)} in this batch)")
 
 		return result
 
-	def write_result(result):
-		with open("facts3.jsonl", "a") as f:
-			if result and result != {} and len(list(result.keys())) and len(result.get("facts", [])):
-				f.write(json.dumps(result) + "\n")
-
-	# Process in batches of `parallel` concurrent tasks
-	for i in range(0, len(chunks), parallel):
-		batch = chunks[i:i+parallel]
-		tasks = [process_and_write_chunk(chunk) for chunk in batch]
-		await asyncio.gather(*tasks)
+	# Keep `parallel` chunks in flight, refilling a slot as soon as one finishes
+	async with JsonlWriter("facts3.jsonl") as writer:
+		results = await run_sliding_window(chunks, process_and_write_chunk, parallel, label="chunks")
+	for idx, result in enumerate(results):
+		if isinstance(result, Exception):
+			print(f"Chunk {idx} failed with: {result}")
 
 	print(f"Completed processing all {total_items} items in {total_chunks} chunks")
+	print(f"Run manifest: {manifest.summary()}")
+	kept, dropped = manifest.compact("facts3.jsonl")
+	print(f"Fact store: {kept} lines, {dropped} superseded lines dropped")
+	print(f"LLM cache: {cache.stats()}")
 
 if __name__ == "__main__":
 	asyncio.run(get_all_facts())
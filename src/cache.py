@@ -0,0 +1,115 @@
+import hashlib
+import sqlite3
+import time
+
+
+def cache_key(model, prompt) -> str:
+	return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+	"""
+	On-disk cache of LLM output text keyed by a hash of model + prompt.
+	Entries are evicted least-recently-used first once the stored text
+	exceeds `max_bytes`. The database is opened on first use, so importing
+	a module that declares a cache creates no file.
+	"""
+
+	def __init__(self, path, max_bytes=2 * 1024 ** 3):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._conn = None
+		self.total_bytes = 0
+
+	@property
+	def conn(self):
+		if self._conn is None:
+			self._open()
+		return self._conn
+
+	def _open(self):
+		self._conn = sqlite3.connect(self.path)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("""
+			CREATE TABLE IF NOT EXISTS responses (
+				key TEXT PRIMARY KEY,
+				model TEXT NOT NULL,
+				output_text TEXT NOT NULL,
+				size INTEGER NOT NULL,
+				created REAL NOT NULL,
+				accessed REAL NOT NULL
+			)
+		""")
+		self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+		self.conn.commit()
+		self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+	def get(self, model, prompt):
+		key = cache_key(model, prompt)
+		row = self.conn.execute("SELECT output_text FROM responses WHERE key = ?", (key,)).fetchone()
+		if row is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+		self.conn.commit()
+		return row[0]
+
+	def put(self, model, prompt, output_text):
+		key = cache_key(model, prompt)
+		size = len(output_text.encode("utf-8"))
+		now = time.time()
+		old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+		if old is not None:
+			self.total_bytes -= old[0]
+		self.conn.execute(
+			"INSERT OR REPLACE INTO responses (key, model, output_text, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+			(key, model, output_text, size, now, now)
+		)
+		self.total_bytes += size
+		self._evict()
+		self.conn.commit()
+
+	def invalidate(self, model, prompt):
+		"""
+		Drop the response stored for model + prompt, e.g. once the caller
+		found it unusable, so the next call goes to the API.
+		"""
+		key = cache_key(model, prompt)
+		old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+		if old is None:
+			return
+		self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+		self.conn.commit()
+		self.total_bytes -= old[0]
+
+	def _evict(self):
+		while self.total_bytes > self.max_bytes:
+			rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 100").fetchall()
+			if not rows:
+				break
+			for key, size in rows:
+				if self.total_bytes <= self.max_bytes:
+					break
+				self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+				self.total_bytes -= size
+				self.evictions += 1
+
+	def stats(self) -> dict:
+		lookups = self.hits + self.misses
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": self.hits / lookups if lookups else 0.0,
+			"evictions": self.evictions,
+			"entries": self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self._conn else 0,
+			"bytes": self.total_bytes
+		}
+
+	def close(self):
+		if self._conn is not None:
+			self._conn.close()
+			self._conn = None
@@ -0,0 +1,108 @@
+import json
+import os
+import sys
+
+# Add parent directory to path to import from src.ratelimit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ratelimit import estimate_tokens, CHARS_PER_TOKEN
+
+# Tokens added by the ", " separator between items in a serialized list
+SEPARATOR_TOKENS = 1
+
+
+def measure(item) -> tuple[int, int]:
+	"""
+	Return (chars, tokens) of an item as it will appear in a prompt. Tokens
+	are estimated at CHARS_PER_TOKEN characters each rather than counted
+	with the model's tokenizer, so they can be 25-30% low for JSON-heavy
+	items; chunk budgets need to keep that much headroom.
+	"""
+	serialized = json.dumps(item)
+	return len(serialized), estimate_tokens(serialized)
+
+
+def pack_items(items, max_tokens, max_items=None, strategy="ffd", sizes=None):
+	"""
+	Bin-pack items into chunks whose serialized size stays under `max_tokens`.
+	Each item is measured once (or taken from `sizes`, a list of token counts).
+	strategy="ffd" places items largest first into the first chunk with room
+	left, so big documents and small pages share prompts; "sequential" keeps
+	input order and starts a new chunk whenever the current one is full.
+	An item larger than the budget gets a chunk of its own.
+	"""
+	if sizes is None:
+		sizes = [measure(item)[1] for item in items]
+
+	if strategy == "ffd":
+		order = sorted(range(len(items)), key=lambda idx: sizes[idx], reverse=True)
+	elif strategy == "sequential":
+		order = range(len(items))
+	else:
+		raise ValueError(f"Unknown packing strategy: {strategy}")
+
+	bins = []
+	loads = []
+	for idx in order:
+		size = sizes[idx]
+		target = None
+		if strategy == "ffd":
+			for b, load in enumerate(loads):
+				if load + SEPARATOR_TOKENS + size <= max_tokens and (max_items is None or len(bins[b]) < max_items):
+					target = b
+					break
+		elif bins and loads[-1] + SEPARATOR_TOKENS + size <= max_tokens and (max_items is None or len(bins[-1]) < max_items):
+			target = len(bins) - 1
+
+		if target is None:
+			bins.append([idx])
+			loads.append(size)
+		else:
+			bins[target].append(idx)
+			loads[target] += SEPARATOR_TOKENS + size
+
+	# Keep the original relative order of items inside each chunk
+	return [[items[idx] for idx in sorted(b)] for b in bins]
+
+
+def content_key(item) -> str:
+	# Transcript records from tube.py carry their text under "context"
+	return "content" if "content" in item or "context" not in item else "context"
+
+
+def split_document(item, max_tokens, overlap_tokens=500):
+	"""
+	Split an item whose serialized size exceeds `max_tokens` into overlapping
+	sub-documents. Each part keeps the item's other fields and records the
+	character offset of its slice in `char_offset`, so `chars:` locators can
+	be mapped back onto the full document. Cuts prefer paragraph breaks.
+	"""
+	key = content_key(item)
+	content = item.get(key) or ""
+	chars, tokens = measure(item)
+	if tokens <= max_tokens:
+		return [item]
+
+	# Escaping makes serialized text longer than the raw content it holds
+	overhead_chars, overhead = measure({**item, key: ""})
+	escape_ratio = len(content) / max(1, chars - overhead_chars)
+	part_chars = max(1, int((max_tokens - overhead) * CHARS_PER_TOKEN * escape_ratio))
+	overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, part_chars // 4)
+
+	parts = []
+	start = 0
+	while start < len(content):
+		end = min(start + part_chars, len(content))
+		if end < len(content):
+			cut = content.rfind("\n\n", start + part_chars // 2, end)
+			if cut > 0:
+				end = cut
+		parts.append((start, end))
+		if end >= len(content):
+			break
+		start = end - overlap_chars
+
+	return [
+		{**item, key: content[start:end], "char_offset": start, "part": f"{idx + 1}/{len(parts)}"}
+		for idx, (start, end) in enumerate(parts)
+	]
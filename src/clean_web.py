@@ -1,68 +1,32 @@
-import json
+import os
+import sys
 
-seen= []
-clean = []
+# Add parent directory to path to import from src.ingest, src.urls and src.corpus
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-with open("data/web2.json", "r") as f:
-	data = json.load(f)
-	print(f"Total: {len(data)}")
-	for d in data:
-		url = d.get("url", None)
-		if not url:
-			continue
-		title = d.get("title", "")
-		if d.get("openGraph", None):
-			try_title = [o.get("content", None) for o in d.get("openGraph", []) if o.get("property", None) == "og:title"]
-			if len([t for t in try_title if t]) == 1:
-				title = try_title
-		content = d.get("text", None)
-		if not content:
-			continue
-		obj = {
-			"url": url,
-			"title": title,
-			"content": content
-		}
-		if not url in seen:
-			clean.append(obj)
-			seen.append(url)
+from src.ingest import read_records, records_path, ingest, web_record, pdf_record
+from src.urls import SeenIndex, canonical_url
+from src.corpus import CorpusStore
 
-print(f"Final: {len(clean)}")
-
-with open("unique_youtube.json", "r") as f:
-	data = json.load(f)
-	clean += data
+seen = SeenIndex()
+corpus = CorpusStore()
 
 all_pdf_links = {}
-with open("serpclean1pdfs.json", "r") as f:
-	data = json.load(f)
-	for d in data:
-		title = d.get("text", "").split(" - ")[0].replace("[PDF]", "").strip()
-		url = d.get("url", None)
-		if not url:
-			continue
-		if not url in all_pdf_links:
-			all_pdf_links[url] = title
+for d in read_records(records_path("serpclean1pdfs.jsonl")):
+	title = d.get("text", "").split(" - ")[0].replace("[PDF]", "").strip()
+	url = d.get("url", None)
+	if not url:
+		continue
+	all_pdf_links.setdefault(canonical_url(url), title)
+
+with open("all_res.jsonl", "w") as out:
+	read, written = ingest(read_records("data/web2.json"), out, web_record, seen, corpus=corpus, doc_type="web")
+	print(f"Total: {read}")
+	print(f"Final: {written}")
 
-with open("data/pdfs.json", "r") as f:
-	data = json.load(f)
-	for d in data:
-		url = d.get("pdfUrl", None)
-		if not url:
-			continue
-		title = all_pdf_links.get(url, "")
-		content = d.get("extractedText", "").strip().replace("\n\n\n", "\n\n").replace("\t", " ")
-		if not len(content):
-			continue
-		obj = {
-			"url": url,
-			"title": title,
-			"content": content
-		}
-		if not url in seen:
-			clean.append(obj)
-			seen.append(url)
+	_, youtube = ingest(read_records(records_path("unique_youtube.jsonl")), out, seen=seen, corpus=corpus, doc_type="youtube")
+	_, pdfs = ingest(read_records("data/pdfs.json"), out, lambda d: pdf_record(d, all_pdf_links), seen, corpus=corpus, doc_type="pdf")
 
-print(len(clean))
-with open("all_res.json", "w") as f:
-	f.write(json.dumps(clean))
+print(written + youtube + pdfs)
+print(f"Corpus: {corpus.stats()}")
+corpus.close()
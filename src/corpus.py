@@ -0,0 +1,216 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Add parent directory to path to import from src.urls and src.manifest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.urls import canonical_url, youtube_id
+from src.manifest import document_hash
+
+CORPUS_PATH = os.getenv("CORPUS_PATH", "corpus.sqlite")
+
+# Fields stored in their own columns; anything else a record carries is kept as JSON
+CORE_FIELDS = ("url", "title", "content")
+
+
+def guess_type(url) -> str:
+	# One of web, pdf, youtube, linkedin
+	if youtube_id(url) or "youtube" in url:
+		return "youtube"
+	if "linkedin.com" in url:
+		return "linkedin"
+	if ".pdf" in url.lower():
+		return "pdf"
+	return "web"
+
+
+def document_key(record, doc_type) -> str:
+	"""
+	Row key for a record: its canonical URL, except for LinkedIn posts,
+	whose url is the article they share. Those are keyed by the post (its
+	URL, id, or failing both its content) so they neither replace the
+	article's own row nor collapse into one row per shared article.
+	"""
+	if doc_type != "linkedin" or "post_url" not in record and "post_id" not in record:
+		return canonical_url(record["url"])
+	if record.get("post_url"):
+		return f"linkedin:{canonical_url(record['post_url'])}"
+	if record.get("post_id"):
+		return f"linkedin:{record['post_id']}"
+	return f"linkedin:{document_hash(record.get('content') or '')}"
+
+
+class CorpusStore:
+	"""
+	SQLite store of normalized source documents ({url, title, content, ...})
+	keyed by canonical URL (LinkedIn posts by post, see document_key), with
+	each document's type, content hash and ingest time. Title and content are indexed for full-text search when
+	the SQLite build has FTS5.
+	"""
+
+	def __init__(self, path=CORPUS_PATH):
+		self.path = path
+		self.conn = sqlite3.connect(path)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("""
+			CREATE TABLE IF NOT EXISTS documents (
+				id INTEGER PRIMARY KEY,
+				key TEXT NOT NULL UNIQUE,
+				url TEXT NOT NULL,
+				type TEXT NOT NULL,
+				title TEXT,
+				content TEXT NOT NULL,
+				extra TEXT,
+				content_hash TEXT NOT NULL,
+				ingested_at REAL NOT NULL
+			)
+		""")
+		self.conn.execute("CREATE INDEX IF NOT EXISTS documents_type ON documents (type)")
+		self.fts = True
+		try:
+			self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, content, content='documents', content_rowid='id')")
+		except sqlite3.OperationalError:
+			self.fts = False
+		if self.fts:
+			self.conn.executescript("""
+				CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+					INSERT INTO documents_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+				END;
+				CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+					INSERT INTO documents_fts (documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+				END;
+				CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+					INSERT INTO documents_fts (documents_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+					INSERT INTO documents_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+				END;
+			""")
+		self.conn.commit()
+
+	def put(self, record, doc_type=None) -> bool:
+		"""
+		Store a document unless an identical one is already stored under its
+		key. A row of another type is never overwritten. Returns whether
+		anything was written; call commit() once a batch is done.
+		"""
+		if "content" not in record and "context" in record:
+			# Transcripts from older tube.py runs
+			record = dict(record)
+			record["content"] = record.pop("context")
+		if doc_type is None:
+			doc_type = "linkedin" if "post_url" in record else guess_type(record["url"])
+		key = document_key(record, doc_type)
+		content_hash = document_hash(record)
+		old = self.conn.execute("SELECT content_hash, type FROM documents WHERE key = ?", (key,)).fetchone()
+		if old is not None and (old[0] == content_hash or old[1] != doc_type):
+			return False
+		extra = {k: v for k, v in record.items() if k not in CORE_FIELDS}
+		self.conn.execute(
+			"""
+			INSERT INTO documents (key, url, type, title, content, extra, content_hash, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT (key) DO UPDATE SET url = excluded.url, type = excluded.type, title = excluded.title, content = excluded.content,
+				extra = excluded.extra, content_hash = excluded.content_hash, ingested_at = excluded.ingested_at
+			WHERE documents.type = excluded.type
+			""",
+			(key, record["url"], doc_type, record.get("title"), record.get("content") or "",
+				json.dumps(extra) if extra else None, content_hash, time.time())
+		)
+		return True
+
+	def commit(self):
+		self.conn.commit()
+
+	def get(self, url):
+		row = self.conn.execute("SELECT url, title, content, extra FROM documents WHERE key = ?", (canonical_url(url),)).fetchone()
+		return self._record(row) if row else None
+
+	def get_many(self, urls) -> dict:
+		"""
+		Documents for a list of URLs, keyed by canonical URL; URLs that are
+		not in the corpus are left out.
+		"""
+		keys = list({canonical_url(url) for url in urls})
+		found = {}
+		# Stay under SQLite's bound-parameter limit
+		for start in range(0, len(keys), 500):
+			batch = keys[start:start + 500]
+			rows = self.conn.execute(
+				f"SELECT key, url, title, content, extra FROM documents WHERE key IN ({', '.join('?' * len(batch))})", batch
+			).fetchall()
+			for key, *row in rows:
+				found[key] = self._record(row)
+		return found
+
+	def hashes(self, urls=None) -> dict:
+		"""
+		Content hash of each stored document (or of the given URLs), keyed by
+		canonical URL.
+		"""
+		if urls is None:
+			return dict(self.conn.execute("SELECT key, content_hash FROM documents"))
+		keys = list({canonical_url(url) for url in urls})
+		found = {}
+		for start in range(0, len(keys), 500):
+			batch = keys[start:start + 500]
+			found.update(self.conn.execute(
+				f"SELECT key, content_hash FROM documents WHERE key IN ({', '.join('?' * len(batch))})", batch
+			))
+		return found
+
+	def iter_documents(self, types=None):
+		"""
+		Yield every document, or those of the given types, in ingest order.
+		"""
+		query = "SELECT url, title, content, extra FROM documents"
+		params = []
+		if types:
+			query += f" WHERE type IN ({', '.join('?' * len(types))})"
+			params = list(types)
+		for row in self.conn.execute(query + " ORDER BY id", params):
+			yield self._record(row)
+
+	def search(self, query, limit=50) -> list[dict]:
+		"""
+		Documents matching a full-text query (FTS5 syntax), best match first.
+		Without FTS5 the query is matched as a plain substring of the content.
+		"""
+		if self.fts:
+			rows = self.conn.execute(
+				"""
+				SELECT d.url, d.title, d.content, d.extra FROM documents_fts
+				JOIN documents d ON d.id = documents_fts.rowid
+				WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?
+				""",
+				(query, limit)
+			)
+		else:
+			rows = self.conn.execute("SELECT url, title, content, extra FROM documents WHERE content LIKE ? LIMIT ?", (f"%{query}%", limit))
+		return [self._record(row) for row in rows]
+
+	def stats(self) -> dict:
+		return dict(self.conn.execute("SELECT type, COUNT(*) FROM documents GROUP BY type"))
+
+	def close(self):
+		self.conn.close()
+
+	def _record(self, row):
+		url, title, content, extra = row
+		record = {"url": url, "title": title, "content": content}
+		if extra:
+			record.update(json.loads(extra))
+		return record
+
+
+if __name__ == "__main__":
+	# Load ingest outputs (e.g. all_res.jsonl clean_linkedin.jsonl) into the corpus
+	from src.ingest import read_records, records_path
+
+	corpus = CorpusStore()
+	for path in sys.argv[1:] or ["all_res.jsonl"]:
+		written = sum(corpus.put(record) for record in read_records(records_path(path)) if record.get("url"))
+		corpus.commit()
+		print(f"{path}: {written} documents added or updated")
+	print(corpus.stats())
+	corpus.close()
@@ -1,77 +1,146 @@
+import hashlib
 import json
+import os
+import re
+import sys
 
+# Add parent directory to path to import from src.near_dedup, src.filters and src.manifest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Typographic quote variants folded onto their ASCII equivalents
+QUOTE_TABLE = str.maketrans({
+	"\u2018": "'", "\u2019": "'", "\u201a": "'", "\u201b": "'", "\u2032": "'", "`": "'",
+	"\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"', "\u2033": '"', "\u00ab": '"', "\u00bb": '"'
+})
+WHITESPACE_RE = re.compile(r"\s+")
 
-def get_clean_facts(file_name, all, raw_list):
-	with open("final_facts.jsonl", "r") as f:
-		for line in f:
-			line = line.strip()
-			if not line:
-				continue
-			# Parse the JSON object
-			try:
-				obj = json.loads(line)
-			except json.JSONDecodeError:
-				continue
 
-			# Skip if obj is None or not a dictionary
-			if not obj or not isinstance(obj, dict):
+def excerpt_key(text):
+	"""
+	Hash of an excerpt with whitespace, quote style and case folded, so that
+	copies differing only in formatting share a key.
+	"""
+	normalized = WHITESPACE_RE.sub(" ", text.translate(QUOTE_TABLE)).strip().casefold()
+	return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def merge_sources(target, sources):
+	known = {s.get("url") for s in target}
+	for s in sources:
+		if s.get("url") not in known:
+			target.append(s)
+			known.add(s.get("url"))
+
+
+def get_clean_facts(file_name, all, seen):
+	"""
+	`seen` maps excerpt_key() to the excerpt already kept; pass {} on the first
+	call and the returned index on later ones. A duplicate excerpt adds its
+	sources to the kept copy instead of being appended again. Lines that a
+	re-extraction has superseded (see RunManifest.is_current) are skipped.
+	"""
+	from src.manifest import read_current
+
+	for obj in read_current(file_name):
+		# Skip if obj is None or not a dictionary
+		if not obj or not isinstance(obj, dict):
+			continue
+		sources = obj.get("sources", [])
+		if not len(sources):
+			continue
+		clean_sources = {}
+		for s in sources:
+			access_status = s.get("access_status", "")
+			access_notes = s.get("access_notes", "")
+			source_id = s.get("source_id", None)
+			url = s.get("url", None)
+			if "error" in access_status or "error" in access_notes or "not access" in access_notes or not source_id or "blocked" in access_notes.lower() or "forbidden" in access_notes.lower() or "failed" in access_notes.lower() or not url:
 				continue
-			sources = obj.get("sources", [])
-			if not len(sources):
+			new_source = {
+				"url": url,
+				"title": s.get("title", "unknown"),
+				"authors": s.get("authors", []),
+				"publisher": s.get("publisher", "unknown"),
+				"date": s.get("publication_date", "unknown")
+			}
+			clean_sources[source_id] = new_source
+		excerpts = obj.get("excerpts", [])
+		if not len(excerpts):
+			continue
+		for e in excerpts:
+			cat = e.get("category", "")
+			subcat = e.get("subcategory", "")
+			text = e.get("excerpt_text", None)
+			if not text:
 				continue
-			clean_sources = {}
-			for s in sources:
-				access_status = s.get("access_status", "")
-				access_notes = s.get("access_notes", "")
-				source_id = s.get("source_id", None)
-				url = s.get("url", None)
-				if "error" in access_status or "error" in access_notes or "not access" in access_notes or not source_id or "blocked" in access_notes.lower() or "forbidden" in access_notes.lower() or "failed" in access_notes.lower() or not url:
+			evidence = e.get("evidence", [])
+			eses = []
+			for ev in evidence:
+				s_id = ev.get("source_id", None)
+				if not s_id:
 					continue
-				new_source = {
-					"url": url,
-					"title": s.get("title", "unknown"),
-					"authors": s.get("authors", []),
-					"publisher": s.get("publisher", "unknown"),
-					"date": s.get("publication_date", "unknown")
-				}
-				clean_sources[source_id] = new_source
-			excerpts = obj.get("excerpts", [])
-			if not len(excerpts):
+				if s_id in clean_sources:
+					eses.append(clean_sources[s_id])
+			if not len(eses):
 				continue
-			for e in excerpts:
-				cat = e.get("category", "")
-				subcat = e.get("subcategory", "")
-				text = e.get("excerpt_text", None)
-				if not text or text in raw_list:
-					continue
-				evidence = e.get("evidence", [])
-				eses = []
-				for ev in evidence:
-					s_id = ev.get("source_id", None)
-					if not s_id:
-						continue
-					if s_id in clean_sources:
-						eses.append(clean_sources[s_id])
-				if not len(eses):
-					continue
-				new_ex = {
-					"content": text,
-					"sources": eses,
-					"category": cat,
-					"subcategory": subcat
-				}
-				if all.get(cat, {}).get(subcat, None):
-					all[cat][subcat].append(new_ex)
-				elif all.get(cat, None):
-					all[cat][subcat] = [new_ex]
-				else:
-					all[cat] = {}
-					all[cat][subcat] = [new_ex]
-				raw_list.append(text)
-	return all, raw_list
+			key = excerpt_key(text)
+			if key in seen:
+				merge_sources(seen[key]["sources"], eses)
+				continue
+			new_ex = {
+				"content": text,
+				"sources": eses,
+				"category": cat,
+				"subcategory": subcat
+			}
+			if all.get(cat, {}).get(subcat, None):
+				all[cat][subcat].append(new_ex)
+			elif all.get(cat, None):
+				all[cat][subcat] = [new_ex]
+			else:
+				all[cat] = {}
+				all[cat][subcat] = [new_ex]
+			seen[key] = new_ex
+	return all, seen
+
+def collapse_near_duplicates(all, threshold=0.7, shingle_size=3):
+	"""
+	Cluster near-identical excerpts (e.g. one quote syndicated with small
+	wording changes) across every category of a get_clean_facts() result.
+	Each cluster is reduced to one canonical excerpt, the member cited by the
+	most sources (longest text on ties), which takes the union of the
+	cluster's sources.
+	"""
+	from src.near_dedup import find_clusters
+
+	excerpts = [ex for subcat_obj in all.values() for facts in subcat_obj.values() for ex in facts]
+	# Excerpts are short (10-50 words), so small shingles keep a one-word edit
+	# from knocking out most of the shared shingles
+	clusters = find_clusters([ex["content"] for ex in excerpts], threshold=threshold, shingle_size=shingle_size)
+
+	keep = set()
+	for cluster in clusters:
+		members = [excerpts[idx] for idx in cluster]
+		canonical = max(members, key=lambda ex: (len(ex["sources"]), len(ex["content"])))
+		for ex in members:
+			if ex is not canonical:
+				merge_sources(canonical["sources"], ex["sources"])
+		keep.add(id(canonical))
+
+	collapsed = {}
+	for cat, subcat_obj in all.items():
+		for subcat, facts in subcat_obj.items():
+			kept = [ex for ex in facts if id(ex) in keep]
+			if kept:
+				collapsed.setdefault(cat, {})[subcat] = kept
+	print(f"Near-duplicate clustering: {len(excerpts)} excerpts -> {len(keep)} canonical excerpts")
+	return collapsed
 
 def clean():
+	from src.filters import load_filters
+
+	filters = load_filters()
+	subcat_filter, fact_filter = filters["fact_subcategories"], filters["facts"]
 	data = None
 	cleaned = {}
 	num_facts_old = 0
@@ -81,8 +150,7 @@ def clean():
 	for cat, subcat_obj in data.items():
 		new_cat = {}
 		for subcat, facts in subcat_obj.items():
-			bad_subcats = ["disclaimer", "controversy", "death", "illness", "bereavement", "obituary", "error", "unauthorized", "access denied", "unavailable", "fail", "coffee", " tea ", "Coffee", " Tea ", "Last updated", "last updated", "last-updated", "Last-Updated", "Last Updated"]
-			if not len(facts) or any([k in subcat.lower() for k in bad_subcats]):
+			if not len(facts) or not subcat_filter.keep({"subcategory": subcat}):
 				continue
 			num_facts_old += len(facts)
 			clean_facts = []
@@ -92,8 +160,7 @@ def clean():
 				source = fact.get("source", None)
 				if not content or not source:
 					continue
-				bad_keys = ["pharma", "hospital", "real estate", "HP", "hotel", "restaurant", "cricket", "lawyer", "law group", "virus", "phd", "medical", "cancer", "clinic", "doctor", "hospital", "tuition", "arrest", "HR", "EdenTree", "attourney", "Attourney", "dystrophin", "cell", "realtor", 'ecommerce', 'shop owner', 'store owner', 'microbiology', 'university of i', 'legal case', 'robbery', 'crime', " visa ", " filing ", ""]
-				if any([k.lower() in content.lower() for k in bad_keys]) or any([k in source.get("title", "") for k in bad_keys]):
+				if not fact_filter.keep({"content": content, "title": source.get("title", "")}):
 					continue
 				clean_facts.append(
 					{
@@ -109,6 +176,8 @@ def clean():
 			continue
 		cleaned[cat] = new_cat
 	print(f"Original fact list length: {num_facts_old} | New clean fact list length: {num_facts_new}")
+	print(subcat_filter.report())
+	print(fact_filter.report())
 	return cleaned
 
 def clean_list():
@@ -124,46 +193,47 @@ def clean_list():
 				cl.append(f)
 	return cl
 
-def group_by_source():
-	data = None
-	cl = []
-	sources = []
-	with open("all_facts_final.json") as f:
-		data = json.load(f)
-	for d in data:
+def group_facts_by_source(facts):
+	"""
+	Group facts under their source in one pass, keyed by source URL. Sources
+	keep the order in which their URL is first seen and get that position as
+	"id"; each source's facts keep their input order.
+	"""
+	by_url = {}
+	for d in facts:
 		source = d.get("source", None)
 		if not source:
 			continue
 		url = source.get("url", None)
 		if not url:
 			continue
-		if not url in cl:
-			cl.append(url)
-			idx = cl.index(url)
-			source["id"] = idx
-			sources.append(source)
-		else:
+		s = by_url.get(url)
+		if s is None:
+			s = dict(source)
+			s["id"] = len(by_url)
+			s["facts"] = []
+			by_url[url] = s
+		content = d.get("content", None)
+		info_type = d.get("info_type", None)
+		if not content or not info_type:
 			continue
-	all = []
-	for so in sources:
-		s = dict(so)
-		url = s["url"]
-		vals = [d for d in data if d["source"]["url"] == url]
-		clean_facts = []
-		for v in vals:
-			content = v.get("content", None)
-			info_type = v.get("info_type", None)
-			if not content or not info_type:
-				continue
-			f = {
-				"content": content,
-				"info_type": info_type
-			}
-			clean_facts.append(f)
-		s["facts"] = list(clean_facts)
-		all.append(s)
-	return all
+		s["facts"].append({
+			"content": content,
+			"info_type": info_type
+		})
+	return list(by_url.values())
 
+def group_by_source(file_name="all_facts_final.json", stream=False):
+	"""
+	With stream=True the fact list is read element by element instead of
+	being loaded whole, so only the grouped output is held in memory.
+	"""
+	if stream:
+		from src.json_stream import iter_json_array
+		return group_facts_by_source(iter_json_array(file_name))
+	with open(file_name) as f:
+		data = json.load(f)
+	return group_facts_by_source(data)
 
 
 if __name__ == "__main__":
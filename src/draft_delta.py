@@ -0,0 +1,139 @@
+import os
+import re
+import sys
+import time
+
+# Add parent directory to path to import from src.draft_merge
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.draft_merge import DraftMerger, LEDGERS, ref_names, rewrite_refs
+
+# Ledger operations: op name -> (draft ledger, op field holding the entry)
+LEDGER_OPS = {
+	"add_claim": ("claim_ledger", "claim"),
+	"add_quote": ("quote_bank", "quote"),
+	"add_prediction": ("prediction_bank", "prediction")
+}
+SECTION_OPS = {"replace_section", "add_section"}
+OPS = {"add_reference", "add_gap"} | set(LEDGER_OPS) | SECTION_OPS
+
+WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def select_sections(page_draft, source_list, max_sections=3, exclude=("References", "Further reading")) -> list[str]:
+	"""
+	Headings of the sections whose vocabulary overlaps most with a batch of
+	sources, so a delta prompt only has to carry those sections in full.
+	"""
+	source_words = set(WORD_RE.findall(" ".join(str(s.get("title") or "") + " " + str(s.get("content") or "") for s in source_list).lower()))
+	scored = []
+	for section in page_draft.get("sections", []):
+		heading = section.get("heading", "")
+		if heading in exclude:
+			continue
+		words = set(WORD_RE.findall(section.get("wikitext", "").lower()))
+		if not words:
+			continue
+		# Normalize by section size so long sections do not always win
+		scored.append((len(words & source_words) / len(words) ** 0.5, heading))
+	return [heading for _, heading in sorted(scored, reverse=True)[:max_sections]]
+
+
+def apply_delta(page_draft, operations, editable_sections=None, run_summary="") -> tuple[dict, dict]:
+	"""
+	Apply delta operations returned by the model to a copy of `page_draft`:
+
+		{"op": "add_reference", "ref_id": "NEW1", "reference": {...}}
+		{"op": "add_claim", "claim": {...}}          (also add_quote, add_prediction)
+		{"op": "replace_section", "heading": "...", "wikitext": "..."}
+		{"op": "add_section", "heading": "...", "wikitext": "..."}
+		{"op": "add_gap", "gap": "..."}
+
+	References and ledger entries go through a DraftMerger, so duplicates
+	collapse onto existing ids and every ref_ids list and <ref name=...> tag
+	in the other operations is rewritten to the final ids. With
+	`editable_sections` set, replace_section is only allowed for those
+	headings (the ones the model was shown in full). Returns (new draft,
+	report) where the report lists what was applied, what was rejected and
+	why, and cited ref ids that do not exist.
+	"""
+	merger = DraftMerger(page_draft)
+	draft = merger.draft
+	report = {"applied": 0, "rejected": [], "new_references": merger.new_references, "unresolved_refs": set()}
+	modified = []
+
+	valid = []
+	for op in operations:
+		if not isinstance(op, dict) or op.get("op") not in OPS:
+			report["rejected"].append({"op": op, "reason": "unknown operation"})
+		else:
+			valid.append(op)
+
+	# References first, so every other operation can be rewritten to final ids
+	mapping = {}
+	for op in valid:
+		if op["op"] != "add_reference":
+			continue
+		if not op.get("ref_id") or not isinstance(op.get("reference"), dict):
+			report["rejected"].append({"op": op, "reason": "reference without ref_id"})
+			continue
+		mapping[op["ref_id"]] = merger.add_reference(op["reference"], op["ref_id"])
+		report["applied"] += 1
+	valid = rewrite_refs([op for op in valid if op["op"] != "add_reference"], mapping)
+
+	def check_refs(ref_ids):
+		report["unresolved_refs"].update(ref_id for ref_id in ref_ids if ref_id not in draft["references"])
+
+	sections = draft.setdefault("sections", [])
+	for op in valid:
+		kind = op["op"]
+		if kind in LEDGER_OPS:
+			ledger, field = LEDGER_OPS[kind]
+			entry = op.get(field)
+			if not isinstance(entry, dict):
+				report["rejected"].append({"op": op, "reason": f"missing {field}"})
+				continue
+			# Ids are always assigned locally
+			id_field = LEDGERS[ledger][1]
+			merger.add_entry(ledger, {k: v for k, v in entry.items() if k != id_field})
+			check_refs(entry.get("ref_ids") or [])
+		elif kind in SECTION_OPS:
+			heading = op.get("heading")
+			wikitext = op.get("wikitext")
+			if not heading or wikitext is None:
+				report["rejected"].append({"op": op, "reason": "section without heading or wikitext"})
+				continue
+			existing = next((s for s in sections if s.get("heading", "").casefold() == heading.casefold()), None)
+			if kind == "replace_section":
+				if existing is None:
+					report["rejected"].append({"op": op, "reason": "no such section"})
+					continue
+				if editable_sections is not None and existing.get("heading") not in editable_sections:
+					report["rejected"].append({"op": op, "reason": "section was not shown to the model"})
+					continue
+				existing["wikitext"] = wikitext
+				modified.append({"section": existing["heading"], "what": op.get("summary", "Rewrote section."), "refs": []})
+			else:
+				if existing is not None:
+					report["rejected"].append({"op": op, "reason": "section already exists"})
+					continue
+				# New sections go before the reference list
+				position = next((idx for idx, s in enumerate(sections) if s.get("heading") == "References"), len(sections))
+				sections.insert(position, {"heading": heading, "wikitext": wikitext})
+				merger.added.append({"section": heading, "what": op.get("summary", "Added section."), "refs": []})
+			check_refs(ref_names(wikitext))
+		elif kind == "add_gap":
+			merger.add_gap(op.get("gap"))
+		report["applied"] += 1
+
+	draft["page_version"] = (draft.get("page_version") or 0) + 1
+	draft["last_updated_utc"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+	draft["revision_log"] = {
+		"run_summary": run_summary,
+		"added": merger.added,
+		"modified": modified,
+		"removed": [],
+		"new_references_added": merger.new_references
+	}
+	report["unresolved_refs"] = sorted(report["unresolved_refs"])
+	return draft, report
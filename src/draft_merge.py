@@ -0,0 +1,243 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import sys
+
+# Add parent directory to path to import from src.urls and src.draft_store
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.urls import canonical_url
+from src.draft_store import atomic_write_json
+
+# Ledgers in a page draft: key -> (text field, id field, id prefix)
+LEDGERS = {
+	"claim_ledger": ("claim", "claim_id", "C"),
+	"quote_bank": ("quote_text", "quote_id", "Q"),
+	"prediction_bank": ("prediction_text", "prediction_id", "P")
+}
+
+# Quoted names may contain spaces; unquoted ones end at whitespace, / or >
+REF_NAME_RE = re.compile(r'(<ref\s+name\s*=\s*)("[^"]*"|[^"\s/>]+)')
+NON_WORD_RE = re.compile(r"\W+")
+
+
+def next_id(existing, prefix) -> int:
+	"""
+	The number after the highest `prefix`<n> id in `existing`.
+	"""
+	numbers = [int(m.group(1)) for m in (re.fullmatch(rf"{prefix}(\d+)", str(i)) for i in existing) if m]
+	return max(numbers, default=0) + 1
+
+
+def ref_names(text):
+	"""
+	Yield the name of every <ref name=...> tag in wikitext.
+	"""
+	for match in REF_NAME_RE.finditer(text):
+		yield match.group(2).strip('"')
+
+
+def rename_refs(text, mapping) -> str:
+	"""
+	Rewrite the names of <ref name=...> tags in wikitext through `mapping`.
+	"""
+	def rename(match):
+		name = match.group(2).strip('"')
+		return f'{match.group(1)}"{mapping[name]}"' if name in mapping else match.group(0)
+
+	return REF_NAME_RE.sub(rename, text)
+
+
+def rewrite_refs(value, mapping):
+	"""
+	Rewrite reference ids through `mapping` everywhere in a draft or part of
+	one: <ref name=...> tags in strings, `ref_ids` lists (deduplicated) and
+	`ref_id` fields.
+	"""
+	if isinstance(value, str):
+		return rename_refs(value, mapping)
+	if isinstance(value, list):
+		return [rewrite_refs(item, mapping) for item in value]
+	if isinstance(value, dict):
+		rewritten = {}
+		for key, item in value.items():
+			if key == "ref_ids" and isinstance(item, list):
+				rewritten[key] = list(dict.fromkeys(mapping.get(ref_id, ref_id) for ref_id in item))
+			elif key == "ref_id" and isinstance(item, str):
+				rewritten[key] = mapping.get(item, item)
+			else:
+				rewritten[key] = rewrite_refs(item, mapping)
+		return rewritten
+	return value
+
+
+def strings(value):
+	"""
+	Yield every string in a nested structure, in document order.
+	"""
+	if isinstance(value, str):
+		yield value
+	elif isinstance(value, list):
+		for item in value:
+			yield from strings(item)
+	elif isinstance(value, dict):
+		for item in value.values():
+			yield from strings(item)
+
+
+def text_key(text) -> str:
+	# Case, punctuation and spacing do not make two entries different
+	normalized = NON_WORD_RE.sub(" ", str(text or "").casefold()).strip()
+	return hashlib.sha1(normalized.encode("utf-8")).hexdigest() if normalized else ""
+
+
+def reference_key(reference) -> str:
+	if reference.get("url"):
+		return canonical_url(reference["url"])
+	return text_key(reference.get("citation_wikitext") or reference.get("title"))
+
+
+class DraftMerger:
+	"""
+	Merges references, ledger entries and gaps into a copy of a page draft
+	without a model. References are indexed by canonical URL and ledger
+	entries by a hash of their normalized text: a duplicate takes the id of
+	the entry already there (a ledger duplicate adds its ref_ids to it), and
+	anything new gets the next R/C/Q/P id.
+	"""
+
+	def __init__(self, page_draft):
+		self.draft = copy.deepcopy(page_draft)
+		self.references = self.draft.setdefault("references", {})
+		self.ref_index = {}
+		for ref_id, reference in self.references.items():
+			self.ref_index.setdefault(reference_key(reference), ref_id)
+		self.ledger_index = {ledger: {} for ledger in LEDGERS}
+		for ledger, (text_field, _, _) in LEDGERS.items():
+			for entry in self.draft.get(ledger) or []:
+				key = text_key(entry.get(text_field))
+				if key:
+					self.ledger_index[ledger].setdefault(key, entry)
+		self.new_references = []
+		self.added = []
+		self.merged = []
+
+	def add_reference(self, reference, ref_id=None) -> str:
+		"""
+		Final id for a reference, adding it unless the draft already has one
+		with the same key. `ref_id` is the id it was cited by.
+		"""
+		if ref_id in self.references:
+			return ref_id
+		key = reference_key(reference)
+		if key and key in self.ref_index:
+			return self.ref_index[key]
+		# A well-formed id that is still free is kept; provisional ones are replaced
+		final_id = ref_id if ref_id and re.fullmatch(r"R\d+", ref_id) else f"R{next_id(self.references, 'R')}"
+		self.references[final_id] = {**reference, "ref_id": final_id}
+		if key:
+			self.ref_index[key] = final_id
+		self.new_references.append(final_id)
+		return final_id
+
+	def add_references(self, references) -> dict:
+		"""
+		Add {provisional id: reference}; returns {provisional id: final id}.
+		"""
+		return {ref_id: self.add_reference(reference, ref_id) for ref_id, reference in references.items()}
+
+	def add_entry(self, ledger, entry) -> tuple[str, bool]:
+		"""
+		Add a ledger entry (already rewritten to final ref ids). Returns its
+		final id and whether it was new. Strip provisional ids first.
+		"""
+		text_field, id_field, prefix = LEDGERS[ledger]
+		key = text_key(entry.get(text_field))
+		existing = self.ledger_index[ledger].get(key) if key else None
+		if existing is not None:
+			existing["ref_ids"] = list(dict.fromkeys((existing.get("ref_ids") or []) + (entry.get("ref_ids") or [])))
+			self.merged.append(existing[id_field])
+			return existing[id_field], False
+		entries = self.draft.setdefault(ledger, [])
+		used = {e.get(id_field) for e in entries}
+		# Entries that already carry an unused id (from the draft itself) keep it
+		if not entry.get(id_field) or entry[id_field] in used:
+			entry = {**entry, id_field: f"{prefix}{next_id(used, prefix)}"}
+		entries.append(entry)
+		if key:
+			self.ledger_index[ledger][key] = entry
+		self.added.append({"section": ledger, "what": f"Added {entry[id_field]}.", "refs": entry.get("ref_ids") or []})
+		return entry[id_field], True
+
+	def add_gap(self, gap) -> bool:
+		gaps = self.draft.setdefault("gaps_to_fill", [])
+		if not gap or gap in gaps:
+			return False
+		gaps.append(gap)
+		return True
+
+	def merge_patch(self, patch) -> list[dict]:
+		"""
+		Merge a map-reduce patch's references, ledgers and gaps. Returns its
+		section_additions rewritten to final ref ids, for the caller to
+		integrate into the sections.
+		"""
+		mapping = self.add_references(patch.get("references") or {})
+		patch = rewrite_refs(patch, mapping)
+		for ledger, (_, id_field, _) in LEDGERS.items():
+			for entry in patch.get(ledger) or []:
+				if isinstance(entry, dict):
+					self.add_entry(ledger, {k: v for k, v in entry.items() if k != id_field})
+		for gap in patch.get("gaps_to_fill") or []:
+			self.add_gap(gap)
+		return [addition for addition in patch.get("section_additions") or [] if isinstance(addition, dict)]
+
+
+def normalize_draft(page_draft, compact=False) -> tuple[dict, dict]:
+	"""
+	Deduplicate a whole draft's references and ledgers and rewrite every
+	reference to the surviving ids. With `compact`, references are also
+	renumbered R1, R2, ... in order of first citation. Returns the new draft
+	and the {old ref id: new ref id} mapping that was applied.
+	"""
+	merger = DraftMerger({"references": {}})
+	# Well-formed ids first, so malformed ones cannot be renumbered onto them
+	references = page_draft.get("references") or {}
+	mapping = merger.add_references({ref_id: ref for ref_id, ref in references.items() if re.fullmatch(r"R\d+", ref_id)})
+	mapping.update(merger.add_references({ref_id: ref for ref_id, ref in references.items() if ref_id not in mapping}))
+	references = merger.references
+	if compact:
+		text = "\n".join(strings(rewrite_refs([page_draft.get("lead"), page_draft.get("sections")], mapping)))
+		order = [ref_id for ref_id in dict.fromkeys(ref_names(text)) if ref_id in references]
+		order += [ref_id for ref_id in references if ref_id not in order]
+		renumber = {ref_id: f"R{idx}" for idx, ref_id in enumerate(order, 1)}
+		mapping = {old: renumber[new] for old, new in mapping.items()}
+		references = {renumber[ref_id]: {**references[ref_id], "ref_id": renumber[ref_id]} for ref_id in order}
+
+	# Ledgers are emptied in place (keeping key order) and re-added through the merger
+	draft = {key: [] if key in LEDGERS else value for key, value in page_draft.items()}
+	draft["references"] = {}
+	# References already carry their final ids; rewriting them again would
+	# map a renumbered id through the mapping a second time
+	draft = rewrite_refs(draft, mapping)
+	draft["references"] = references
+	merger = DraftMerger(draft)
+	for ledger in LEDGERS:
+		for entry in rewrite_refs(page_draft.get(ledger) or [], mapping):
+			merger.add_entry(ledger, entry)
+	return merger.draft, mapping
+
+
+if __name__ == "__main__":
+	# Deduplicate (and with --compact, renumber) a draft file in place
+	path = next((arg for arg in sys.argv[1:] if not arg.startswith("--")), "final_page_draft.json")
+	with open(path, "r") as f:
+		page_draft = json.load(f)
+	draft, mapping = normalize_draft(page_draft, compact="--compact" in sys.argv)
+	atomic_write_json(path, draft, indent=2)
+	changed = {old: new for old, new in mapping.items() if old != new}
+	print(f"{path}: {len(page_draft.get('references') or {})} -> {len(draft['references'])} references, {len(changed)} ids rewritten")
+	for ledger in LEDGERS:
+		print(f"{ledger}: {len(page_draft.get(ledger) or [])} -> {len(draft.get(ledger) or [])} entries")
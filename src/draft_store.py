@@ -0,0 +1,225 @@
+import fcntl
+import glob
+import json
+import os
+import re
+import time
+
+DRAFT_STORE_PATH = os.getenv("DRAFT_STORE_PATH", "drafts")
+
+# Every SNAPSHOT_EVERY-th version is stored whole, so loading any version
+# replays at most SNAPSHOT_EVERY - 1 diffs
+SNAPSHOT_EVERY = 10
+
+
+def atomic_write_json(path, data, indent=None):
+	"""
+	Write JSON to a temporary file beside `path`, flush it to disk and
+	rename it over `path`, so readers (and a crashed run) only ever see the
+	old or the new file whole.
+	"""
+	tmp_path = f"{path}.tmp"
+	with open(tmp_path, "w") as f:
+		json.dump(data, f, indent=indent)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp_path, path)
+
+
+def diff(old, new, path=()) -> list[dict]:
+	"""
+	Operations that turn `old` into `new`: {"op": "set", "path": [...],
+	"value": ...}, {"op": "remove", "path": [...]} and {"op": "append",
+	"path": [...], "values": [...]}. Dicts are compared key by key and
+	lists of equal length item by item; a list that only grew gets an
+	append, and anything else is replaced whole.
+	"""
+	if old == new:
+		return []
+	if isinstance(old, dict) and isinstance(new, dict):
+		ops = [{"op": "remove", "path": [*path, key]} for key in old if key not in new]
+		for key, value in new.items():
+			if key in old:
+				ops += diff(old[key], value, (*path, key))
+			else:
+				ops.append({"op": "set", "path": [*path, key], "value": value})
+		return ops
+	if isinstance(old, list) and isinstance(new, list):
+		if len(old) == len(new):
+			return [op for idx, (a, b) in enumerate(zip(old, new)) for op in diff(a, b, (*path, idx))]
+		if len(new) > len(old) and new[:len(old)] == old:
+			return [{"op": "append", "path": list(path), "values": new[len(old):]}]
+	return [{"op": "set", "path": list(path), "value": new}]
+
+
+def patch(doc, ops):
+	"""
+	Apply operations from diff() to `doc` in place and return it.
+	"""
+	for op in ops:
+		*parents, last = op["path"] or [None]
+		target = doc
+		for key in parents:
+			target = target[key]
+		if op["op"] == "append":
+			(target[last] if op["path"] else target).extend(op["values"])
+		elif op["op"] == "remove":
+			del target[last]
+		elif not op["path"]:
+			doc = op["value"]
+		else:
+			target[last] = op["value"]
+	return doc
+
+
+class DraftStore:
+	"""
+	Append-only version history of the page draft. Each version is stored
+	as a JSON diff against the one before it, with a full snapshot every
+	SNAPSHOT_EVERY versions, and index.jsonl holds one small line of
+	metadata per version (version, page_version, last_updated_utc, label and
+	where its data lives), so listing versions never parses a draft. Saves
+	hold an exclusive lock on the store, so several processes can append
+	to it.
+	"""
+
+	def __init__(self, path=DRAFT_STORE_PATH):
+		self.path = path
+		self.index_path = os.path.join(path, "index.jsonl")
+		self.diffs_path = os.path.join(path, "diffs.jsonl")
+		self.snapshots_path = os.path.join(path, "snapshots")
+		self.lock_path = os.path.join(path, "lock")
+		os.makedirs(self.snapshots_path, exist_ok=True)
+		self.index = self._read_index()
+		self._cache = (None, None)
+
+	def _read_index(self, truncate=False) -> list[dict]:
+		"""
+		The entries of index.jsonl. A last line without its newline is a
+		version that was never saved (or one being saved right now), so it
+		is skipped; with `truncate` (only while holding the lock) it is also
+		cut off so the next entry does not land on the same line.
+		"""
+		index = []
+		if not os.path.exists(self.index_path):
+			return index
+		with open(self.index_path, "r+") as f:
+			complete = 0
+			for line in iter(f.readline, ""):
+				if not line.endswith("\n"):
+					if truncate:
+						f.truncate(complete)
+					break
+				complete = f.tell()
+				if line.strip():
+					index.append(json.loads(line))
+		return index
+
+	def import_legacy(self) -> int:
+		"""
+		Import the final_page_draft<N>.json copies, oldest first, into an
+		empty store. Returns how many versions were added.
+		"""
+		# Another process may have filled the store since it was opened
+		self.index = self._read_index()
+		if self.index:
+			return 0
+		for path in legacy_draft_files():
+			with open(path, "r") as f:
+				self.save(json.load(f), label=f"Version {len(self.index) + 1}")
+		return len(self.index)
+
+	def versions(self) -> list[dict]:
+		return list(self.index)
+
+	def latest(self) -> dict | None:
+		return self.index[-1] if self.index else None
+
+	def entry(self, version) -> dict:
+		if not 1 <= version <= len(self.index):
+			raise KeyError(f"No draft version {version} in {self.path}")
+		return self.index[version - 1]
+
+	def load(self, version=None) -> dict:
+		"""
+		The draft as of `version` (default: the latest), rebuilt from the
+		nearest snapshot at or before it.
+		"""
+		version = version or len(self.index)
+		cached_version, cached = self._cache
+		if cached_version == version:
+			return json.loads(json.dumps(cached))
+		start = max(v for v in range(1, version + 1) if self.entry(v)["kind"] == "snapshot")
+		with open(os.path.join(self.snapshots_path, f"v{start}.json"), "r") as f:
+			draft = json.load(f)
+		if start < version:
+			with open(self.diffs_path, "r") as f:
+				for v in range(start + 1, version + 1):
+					f.seek(self.entry(v)["offset"])
+					draft = patch(draft, json.loads(f.readline())["ops"])
+		self._cache = (version, draft)
+		return json.loads(json.dumps(draft))
+
+	def save(self, page_draft, label=None) -> int:
+		"""
+		Append `page_draft` as a new version and return its number. A draft
+		identical to the latest version is not stored again. The version
+		number and the diff base come from the index on disk, re-read under
+		the lock, so versions saved by other processes are built on.
+		"""
+		with open(self.lock_path, "a") as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			try:
+				self.index = self._read_index(truncate=True)
+				return self._append(page_draft, label)
+			finally:
+				fcntl.flock(lock, fcntl.LOCK_UN)
+
+	def _append(self, page_draft, label) -> int:
+		previous = self.load() if self.index else None
+		if previous == page_draft:
+			return len(self.index)
+		version = len(self.index) + 1
+		entry = {
+			"version": version,
+			"page_version": page_draft.get("page_version"),
+			"last_updated_utc": page_draft.get("last_updated_utc"),
+			"label": label or f"Version {version}",
+			"saved_at": time.time()
+		}
+		if previous is None or (version - 1) % SNAPSHOT_EVERY == 0:
+			atomic_write_json(os.path.join(self.snapshots_path, f"v{version}.json"), page_draft)
+			entry["kind"] = "snapshot"
+		else:
+			ops = diff(previous, page_draft)
+			with open(self.diffs_path, "a") as f:
+				f.seek(0, os.SEEK_END)
+				entry["offset"] = f.tell()
+				f.write(json.dumps({"version": version, "ops": ops}) + "\n")
+			entry["kind"] = "diff"
+			entry["ops"] = len(ops)
+		# The index line goes last: a version exists once it is indexed
+		with open(self.index_path, "a") as f:
+			f.write(json.dumps(entry) + "\n")
+		self.index.append(entry)
+		self._cache = (version, json.loads(json.dumps(page_draft)))
+		return version
+
+
+def legacy_draft_files(pattern="final_page_draft*.json") -> list[str]:
+	"""
+	final_page_draft.json, final_page_draft2.json, ... in version order.
+	"""
+	def number(path):
+		match = re.search(r"final_page_draft(\d*)\.json$", path)
+		return int(match.group(1) or 1) if match else None
+
+	return sorted((path for path in glob.glob(pattern) if number(path) is not None), key=number)
+
+
+if __name__ == "__main__":
+	# Import the final_page_draft<N>.json copies and list the versions
+	store = DraftStore()
+	print(f"Imported {store.import_legacy()} draft files")
+	for entry in store.versions():
+		print(f"{entry['version']:>4}  {entry['label']:<30} page v{entry.get('page_version')}  {entry.get('last_updated_utc')}  ({entry['kind']})")
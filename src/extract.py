@@ -1,15 +1,40 @@
-from openai import OpenAI
 import json
-from typing import Any
 import re
 import asyncio
 import aiofiles
 import os
+import sys
+from collections import Counter
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Add parent directory to path to import from src.llm
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.llm import stream_gpt, cache, LLMTimeout, MODEL
+from src.json_stream import ArrayItemParser
+from src.manifest import RunManifest, manifest_path, chunk_id, content_hash, chunk_documents, item_key, COMPLETE_STATUSES, STATUS_DONE, STATUS_EMPTY, STATUS_FAILED, STATUS_SPLIT, STATUS_TIMED_OUT
+from src.scheduler import run_sliding_window
+from src.json_repair import parse_json
+from src.jsonl_writer import JsonlWriter
+from src.chunking import pack_items, split_document
+from src.ratelimit import CHARS_PER_TOKEN
+from src.ingest import read_records, records_path
+from src.urls import canonical_url, youtube_id
+from src.corpus import CorpusStore, CORPUS_PATH
+from src.prefilter import RelevanceFilter
+
+# Token budget for the page objects in one prompt, and the most pages per prompt
+CHUNK_TOKENS = 85000 // CHARS_PER_TOKEN
+CHUNK_MAX_ITEMS = 10
+
+# Attempts at a failing chunk before it is bisected, and the backoff between them
+CHUNK_RETRIES = 2
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 60.0
+
 def create_fact_content_prompt(source_objs):
 	prompt = """You are GPT-5.2. You are acting as a “Wikipedia biography source-extraction agent” for a living person (BLP). You DO NOT browse the web in this mode. You must use ONLY the provided page objects (url/title/content) as your evidence corpus.
 
@@ -387,77 +412,122 @@ def create_fact_prompt(sources):
 	"""
 	return prompt
 
-def parse_json(completion: str) -> dict[str, Any] | None:
+
+async def get_facts(source_items, use_cache=True):
 	"""
-	Parse an LLM completion into a dict.
-	Tries multiple strategies to be robust against bad JSON.
+	Returns (facts, status) where status is one of the run manifest statuses.
+	The response is streamed, so when the call times out the sources and
+	excerpts completed so far are returned (marked "partial") with the
+	timed-out status.
 	"""
-	try:
-		parsed = json.loads(completion)
-		return parsed
-	except:
-		m = re.search(r"(\{.*\}|\[.*\])", completion, flags=re.DOTALL)
-		candidate = m.group(1) if m else completion
-
-		for attempt in [candidate, re.sub(r",(\s*[\]\}])", r"\1", candidate)]:
-			try:
-				parsed = json.loads(attempt)
-				return parsed
-			except json.JSONDecodeError:
-				continue
-		return None
-
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-async def get_gpt(prompt):
-	import time
-	start_time = time.time()
-	try:
-		print(f"[{time.strftime('%H:%M:%S')}] Calling GPT API with prompt length: {len(prompt)}")
-		# Run the synchronous OpenAI call in an executor to avoid blocking
-		loop = asyncio.get_event_loop()
-
-		# Add a 5 minute timeout for processing (reduced from 10 since we're not browsing)
-		response = await asyncio.wait_for(
-			loop.run_in_executor(
-				None,
-				lambda: client.responses.create(
-					model="gpt-5.2",
-					input=prompt
-				)
-			),
-			timeout=300.0  # 5 minutes
-		)
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Got response from GPT API (took {elapsed:.1f}s)")
-		return response.output_text
-	except asyncio.TimeoutError:
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Timeout: GPT API call took longer than 5 minutes (elapsed: {elapsed:.1f}s)")
-		return None
-	except Exception as e:
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Error in get_gpt after {elapsed:.1f}s: {e}")
-		return None
-
-async def get_facts(source_items):
 	prompt = create_fact_content_prompt(source_items)
+	parser = ArrayItemParser(["sources", "excerpts"])
 	try:
-		fact_res = await get_gpt(prompt)
-		if fact_res is None:
-			print(f"Warning: get_gpt returned None for chunk")
-			return {}
-		facts = parse_json(fact_res)
-		if facts is None:
-			print(f"Warning: parse_json failed to parse response")
-			return {}
-		return facts
+		fact_res, completed = await stream_gpt(prompt, parser.feed, use_cache=use_cache)
+	except LLMTimeout as e:
+		print(f"Warning: {e} for chunk")
+		return {}, STATUS_TIMED_OUT
 	except Exception as e:
 		print(f"Error in get_facts: {e}")
-		return {}
+		return {}, STATUS_FAILED
+	if not completed:
+		partial = {"sources": parser.items["sources"], "excerpts": parser.items["excerpts"], "partial": True}
+		print(f"Warning: response cut off at the deadline, kept {len(partial['excerpts'])} complete excerpts")
+		return shift_char_locators(partial, source_items), STATUS_TIMED_OUT
+	facts = parse_json(fact_res)
+	if facts is None:
+		# Do not replay the unparseable response on the retry or the next run
+		cache.invalidate(MODEL, prompt)
+		# A response cut off by the output cap still fails (and is retried),
+		# but its complete excerpts are kept in case every retry fails too
+		repaired = parse_json(fact_res, allow_truncated=True)
+		if isinstance(repaired, dict) and repaired.get("excerpts"):
+			print(f"Warning: response was truncated, kept {len(repaired['excerpts'])} complete excerpts as a partial result")
+			return shift_char_locators({**repaired, "partial": True}, source_items), STATUS_FAILED
+		print(f"Warning: parse_json failed to parse response")
+		return {}, STATUS_FAILED
+	if not has_content(facts):
+		return facts, STATUS_EMPTY
+	return shift_char_locators(facts, source_items), STATUS_DONE
+
+def shift_char_locators(result, chunk):
+	"""
+	Rewrite `chars:<start>-<end>` locators of excerpts taken from a document
+	part so they refer to offsets in the full document.
+	"""
+	offsets = {}
+	for item in chunk:
+		# Part 1 has offset 0 and still has to count towards the ambiguity check
+		if "char_offset" in item:
+			url = item.get("url")
+			# Two parts of the same URL in one chunk cannot be told apart
+			offsets[url] = None if url in offsets else item["char_offset"]
+	if not offsets or not isinstance(result, dict):
+		return result
+
+	source_urls = {s.get("source_id"): s.get("url") for s in result.get("sources", []) if isinstance(s, dict)}
+	for excerpt in result.get("excerpts", []):
+		if not isinstance(excerpt, dict) or not isinstance(excerpt.get("locator"), str):
+			continue
+		offset = offsets.get(source_urls.get(excerpt.get("source_id")))
+		if not offset:
+			continue
+		excerpt["locator"] = re.sub(
+			r"chars:(\d+)-(\d+)",
+			lambda m: f"chars:{int(m.group(1)) + offset}-{int(m.group(2)) + offset}",
+			excerpt["locator"]
+		)
+	return result
+
+def has_content(result):
+	return bool(result) and isinstance(result, dict) and bool(len(result.get("excerpts", [])) or len(result.get("sources", [])))
+
+async def get_facts_with_recovery(chunk, manifest, on_result, label="Chunk"):
+	"""
+	Process a chunk, retrying failures with bounded exponential backoff. A chunk
+	that keeps failing is bisected and its halves are processed recursively
+	and sequentially, down to single documents.
+	Every finished (sub-)chunk is passed to `await on_result(chunk, facts, status)`.
+	Returns the list of (sub-chunk, status) pairs that failed permanently.
+	"""
+	import time
+	if manifest.is_complete(chunk):
+		return []
+
+	# A chunk bisected by an earlier run goes straight to its halves
+	if manifest.status(chunk) != STATUS_SPLIT:
+		best_partial = {}
+		for attempt in range(CHUNK_RETRIES + 1):
+			# Retries bypass the cache so an unparseable response is not replayed
+			facts, status = await get_facts(chunk, use_cache=attempt == 0)
+			if status in COMPLETE_STATUSES:
+				await on_result(chunk, facts, status)
+				return []
+			if len(facts.get("excerpts", [])) > len(best_partial.get("excerpts", [])):
+				best_partial = facts
+			if attempt < CHUNK_RETRIES:
+				delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+				print(f"[{time.strftime('%H:%M:%S')}] {label}: {status}, retrying in {delay:.0f}s (attempt {attempt + 2}/{CHUNK_RETRIES + 1})")
+				await asyncio.sleep(delay)
+
+		if len(chunk) == 1:
+			print(f"[{time.strftime('%H:%M:%S')}] {label}: giving up on {chunk[0].get('url', 'unknown')} ({status})")
+			# Keep whatever was extracted before the deadline or the output cap rather than nothing
+			await on_result(chunk, best_partial, status)
+			return [(chunk, status)]
+
+		print(f"[{time.strftime('%H:%M:%S')}] {label}: {status} after {CHUNK_RETRIES + 1} attempts, splitting {len(chunk)} documents in half")
+		manifest.record(chunk, STATUS_SPLIT, last_status=status)
+
+	# The halves run one after the other inside this chunk's scheduler slot,
+	# so bisecting never puts more than `parallel` requests in flight
+	mid = len(chunk) // 2
+	failures = await get_facts_with_recovery(chunk[:mid], manifest, on_result, f"{label}a")
+	failures += await get_facts_with_recovery(chunk[mid:], manifest, on_result, f"{label}b")
+	return failures
 
 async def get_all_facts():
+	import time
 	print("get_all_facts() started")
 
 	# Load the URL list
@@ -466,111 +536,149 @@ async def get_all_facts():
 		url_list = json.load(f)
 	print(f"Loaded {len(url_list)} URLs from final_urls.json")
 
-	# Load the scraped content files
-	print("Loading scraped content files...")
-	with open("url_scrapes/all_res.json", "r") as f:
-		all_res_data = json.load(f)
-	print(f"Loaded {len(all_res_data)} entries from url_scrapes/all_res.json")
-
-	with open("url_scrapes/unique_youtube.json", "r") as f:
-		youtube_data = json.load(f)
-	print(f"Loaded {len(youtube_data)} entries from url_scrapes/unique_youtube.json")
-
-	# Create lookup dictionaries for fast access
-	all_res_lookup = {item["url"]: item for item in all_res_data if "url" in item}
-	youtube_lookup = {item["url"]: item for item in youtube_data if "url" in item}
-	print(f"Created lookup dictionaries")
-
-	parallel = 24  # Process 10 chunks in parallel (50 URLs at a time)
-
-	# Create chunks of 5 URLs each and look up their content
-	chunks = []
-	idx = 0
-
-	while idx < len(url_list):
-		# Get the next 5 URLs
-		url_batch = url_list[idx:idx+5]
-
-		# Look up the content for each URL
-		content_batch = []
-		for url in url_batch:
-			# Determine which lookup to use
-			if "youtube" in url.lower():
-				content_obj = youtube_lookup.get(url)
-			else:
-				content_obj = all_res_lookup.get(url)
-
-			if content_obj:
-				content_batch.append(content_obj)
-			else:
-				print(f"Warning: No content found for URL: {url}")
-
-		if content_batch:
-			chunks.append(content_batch)
-		idx += 5
-
-	print(f"Created {len(chunks)} chunks with content")
-
-	# Lock for file writing
-	write_lock = asyncio.Lock()
+	wanted = {canonical_url(url) for url in url_list}
+	if os.path.exists(CORPUS_PATH):
+		# Fetch just the listed documents from the corpus store
+		corpus = CorpusStore(CORPUS_PATH)
+		all_res_lookup = youtube_lookup = corpus.get_many(wanted)
+		corpus.close()
+		print(f"Loaded {len(all_res_lookup)} entries from {CORPUS_PATH}")
+	else:
+		# Stream the scraped content files, keeping only the documents we need.
+		# Both sides are keyed by canonical URL so tracking parameters, www. or
+		# youtu.be links on the URL list still find their document
+		print("Loading scraped content files...")
+		all_res_path = records_path("url_scrapes/all_res.jsonl")
+		all_res_lookup = {}
+		for item in read_records(all_res_path):
+			key = canonical_url(item.get("url") or "")
+			if key in wanted:
+				all_res_lookup.setdefault(key, item)
+		print(f"Loaded {len(all_res_lookup)} entries from {all_res_path}")
+
+		youtube_path = records_path("url_scrapes/unique_youtube.jsonl")
+		youtube_lookup = {}
+		for item in read_records(youtube_path):
+			key = canonical_url(item.get("url") or "")
+			if key in wanted:
+				youtube_lookup.setdefault(key, item)
+		print(f"Loaded {len(youtube_lookup)} entries from {youtube_path}")
+
+	parallel = 24  # Number of chunks kept in flight at once
+
+	# Look up the content for each URL
+	documents = []
+	queued = set()
+	for url in url_list:
+		key = canonical_url(url)
+		if key in queued:
+			continue
+		queued.add(key)
+		# Determine which lookup to use
+		if youtube_id(url) or "youtube" in url.lower():
+			content_obj = youtube_lookup.get(key)
+		else:
+			content_obj = all_res_lookup.get(key)
+
+		if content_obj:
+			documents.append(content_obj)
+		else:
+			print(f"Warning: No content found for URL: {url}")
+
+	# Drop documents about namesakes before any prompt is built for them
+	relevance = RelevanceFilter()
+	documents = relevance.filter(documents)
+	relevance.write_report("final_facts2.prefilter.json")
+
+	# Split oversized documents into overlapping parts, then pack everything into
+	# chunks of similar token size so chunk latency stays predictable
+	parts = []
+	for doc in documents:
+		parts.extend(split_document(doc, CHUNK_TOKENS))
+
+	# Only parts that are new or changed since they were last extracted are
+	# scheduled; their excerpts are appended to the existing fact store, and
+	# manifest.current_lines() skips the lines they supersede
+	manifest = RunManifest(manifest_path("final_facts2.jsonl"))
+	# Documents the pre-filter now rejects, and parts left over from a
+	# document that is now split differently
+	manifest.retire(manifest.document_keys(rejected["url"] for rejected in relevance.rejected))
+	manifest.retire(manifest.stale_keys(parts))
+	part_statuses = [manifest.document_status(part) for part in parts]
+	print(f"Document parts: {dict(Counter(part_statuses))}")
+	# Unchanged parts that share a line with a changed one are redone with it
+	redo = manifest.companions([item_key(part) for part, status in zip(parts, part_statuses) if status == "changed"])
+	parts = [part for part, status in zip(parts, part_statuses) if status != "unchanged" or item_key(part) in redo]
+	chunks = pack_items(parts, max_tokens=CHUNK_TOKENS, max_items=CHUNK_MAX_ITEMS, strategy="ffd")
+
+	print(f"Created {len(chunks)} chunks with content from {len(documents)} documents ({len(parts)} parts to extract)")
+
+	# Skip chunks a previous run already completed; failed and timed-out ones are retried
+	pending = []
+	for chunk in chunks:
+		if not manifest.is_complete(chunk):
+			pending.append(chunk)
+		elif "documents" not in manifest.entries[chunk_id(chunk)]:
+			# Completed before per-document hashes were recorded; add them now
+			manifest.record(chunk, manifest.status(chunk))
+	print(f"Resuming: {len(chunks) - len(pending)} chunks already complete, {len(pending)} to process ({manifest.summary()})")
+	chunks = pending
 
 	# Track progress
 	total_chunks = len(chunks)
-	total_items = len(url_list)
+	total_items = sum(len(chunk) for chunk in chunks)
 	processed_items = 0
 
-	async def process_and_write_chunk(chunk, chunk_index):
+	permanent_failures = []
+
+	async def write_chunk_result(chunk, result, status):
 		nonlocal processed_items
-		import time
+		# Hand the result to the single writer task; the manifest is only
+		# updated once the line has been flushed
+		if has_content(result):
+			# Ties the line to its manifest entry, and lets readers drop it
+			# once one of its documents is extracted again
+			await writer.write({**result, "chunk_id": chunk_id(chunk), "content_hash": content_hash(chunk), "documents": chunk_documents(chunk)})
+		manifest.record(chunk, status, excerpts=len(result.get("excerpts", [])) if isinstance(result, dict) else 0)
+		processed_items += len(chunk)
+		print(f"[{time.strftime('%H:%M:%S')}] Written {len(chunk)} documents with status {status}. Progress: {processed_items}/{total_items} items")
+
+	async def process_and_write_chunk(chunk, chunk_index):
 		start_time = time.time()
 		try:
 			# Extract URLs for logging
 			urls_preview = [item.get("url", "unknown") for item in chunk[:2]]
 			print(f"[{time.strftime('%H:%M:%S')}] Chunk {chunk_index}: Starting to process {len(chunk)} content objects: {urls_preview}...")
-			result = await get_facts(chunk)
+			failures = await get_facts_with_recovery(chunk, manifest, write_chunk_result, f"Chunk {chunk_index}")
+			permanent_failures.extend(failures)
 			elapsed = time.time() - start_time
-			print(f"[{time.strftime('%H:%M:%S')}] Chunk {chunk_index}: Finished processing after {elapsed:.1f}s, result has {len(result.keys()) if result else 0} keys")
-
-			# Write to facts.jsonl with lock
-			async with write_lock:
-				loop = asyncio.get_event_loop()
-				await loop.run_in_executor(
-					None,
-					lambda: write_result(result)
-				)
-				processed_items += len(chunk)
-				print(f"[{time.strftime('%H:%M:%S')}] Chunk {chunk_index}: Written. Progress: {processed_items}/{total_items} items")
-
-			return result
+			print(f"[{time.strftime('%H:%M:%S')}] Chunk {chunk_index}: Finished processing after {elapsed:.1f}s with {len(failures)} failed documents")
+			return failures
 		except Exception as e:
 			elapsed = time.time() - start_time
 			print(f"[{time.strftime('%H:%M:%S')}] Chunk {chunk_index}: Error after {elapsed:.1f}s: {e}")
-			processed_items += len(chunk)
-			return {}
-
-	def write_result(result):
-		with open("final_facts2.jsonl", "a") as f:
-			if result and result != {} and len(list(result.keys())) and (len(result.get("excerpts", [])) or len(result.get("sources", []))):
-				f.write(json.dumps(result) + "\n")
-
-	# Process in batches of `parallel` concurrent tasks
-	import time
-	for i in range(0, len(chunks), parallel):
-		batch = chunks[i:i+parallel]
-		batch_start = time.time()
-		print(f"\n[{time.strftime('%H:%M:%S')}] ===== Processing batch {i//parallel + 1}/{(len(chunks) + parallel - 1)//parallel}, with {len(batch)} chunks =====")
-		tasks = [process_and_write_chunk(chunk, i+idx) for idx, chunk in enumerate(batch)]
-		results = await asyncio.gather(*tasks, return_exceptions=True)
+			manifest.record(chunk, STATUS_FAILED, error=str(e))
+			return []
 
-		# Log any exceptions
-		for idx, result in enumerate(results):
-			if isinstance(result, Exception):
-				print(f"[{time.strftime('%H:%M:%S')}] Chunk {i+idx} in batch {i//parallel + 1} failed with: {result}")
+	# Keep `parallel` chunks in flight, refilling a slot as soon as one finishes
+	async with JsonlWriter("final_facts2.jsonl") as writer:
+		results = await run_sliding_window(chunks, process_and_write_chunk, parallel, label="chunks")
 
-		batch_elapsed = time.time() - batch_start
-		print(f"[{time.strftime('%H:%M:%S')}] ===== Completed batch {i//parallel + 1} in {batch_elapsed:.1f}s =====\n")
+	# Log any exceptions
+	for idx, result in enumerate(results):
+		if isinstance(result, Exception):
+			print(f"[{time.strftime('%H:%M:%S')}] Chunk {idx} failed with: {result}")
 
 	print(f"Completed processing all {total_items} items in {total_chunks} chunks")
+	print(f"Run manifest: {manifest.summary()}")
+	kept, dropped = manifest.compact("final_facts2.jsonl")
+	print(f"Fact store: {kept} lines, {dropped} superseded lines dropped")
+
+	# Report documents that failed even on their own
+	with open("final_facts2.failures.json", "w") as f:
+		json.dump([{"url": chunk[0].get("url"), "part": chunk[0].get("part"), "status": status} for chunk, status in permanent_failures], f, indent=2)
+	print(f"{len(permanent_failures)} documents failed permanently, listed in final_facts2.failures.json")
+	print(f"LLM cache: {cache.stats()}")
 
 if __name__ == "__main__":
 	print("Starting extract.py script...")
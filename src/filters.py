@@ -0,0 +1,112 @@
+import json
+import os
+import re
+from collections import Counter, defaultdict
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filter_rules.json")
+
+
+class KeywordFilter:
+	"""
+	A set of include/exclude keyword rules compiled into one regex per
+	document field. A rule looks like
+
+		{"name": "medical", "action": "exclude", "fields": ["content"],
+		 "terms": ["hospital", "clinic"], "case_sensitive": false, "all": false}
+
+	and fires when any of its terms (every one of them with "all": true)
+	occurs as a substring of one of its fields. A document is kept when no
+	exclude rule fires and, if the set has include rules, at least one of
+	those does. `hits` counts how often each rule fired across checked
+	documents.
+	"""
+
+	def __init__(self, rules, name="filter"):
+		self.name = name
+		self.rules = rules
+		self.hits = Counter()
+		self.checked = 0
+		self.rejected = 0
+		self.include = {idx for idx, rule in enumerate(rules) if rule.get("action", "exclude") == "include"}
+		self.required = []
+		# field -> term -> rule indices; a term is (text, case_sensitive),
+		# lowercased when case-insensitive
+		field_terms = defaultdict(lambda: defaultdict(set))
+		for idx, rule in enumerate(rules):
+			case_sensitive = rule.get("case_sensitive", False)
+			terms = {term if case_sensitive else term.lower() for term in rule["terms"] if term}
+			self.required.append(len(terms) if rule.get("all", False) else 1)
+			for field in rule.get("fields", ["text"]):
+				for term in terms:
+					field_terms[field][(term, case_sensitive)].add(idx)
+
+		# Case-insensitive terms are matched against the lowercased field, so
+		# each field gets up to two plain literal alternations. A regex match
+		# only marks a position where some term may start; the candidates for
+		# that position are then compared directly, so overlapping terms
+		# ("hospital", "hospitality") all register
+		self.fields = defaultdict(list)
+		for field, terms in field_terms.items():
+			for case_sensitive in (True, False):
+				ordered = sorted((text for text, cs in terms if cs == case_sensitive), key=len, reverse=True)
+				if not ordered:
+					continue
+				candidates = defaultdict(list)
+				for text in ordered:
+					candidates[text[0]].append((text, terms[(text, case_sensitive)]))
+				regex = re.compile("|".join(re.escape(text) for text in ordered))
+				self.fields[field].append((case_sensitive, regex, dict(candidates)))
+
+	def fired(self, doc) -> list[str]:
+		"""
+		Names of the rules that fire for `doc`, a dict of field name to text.
+		"""
+		return [self.rules[idx]["name"] for idx in self._fired_ids(doc)]
+
+	def _fired_ids(self, doc):
+		found = defaultdict(set)
+		for field, matchers in self.fields.items():
+			text = doc.get(field) or ""
+			if not text:
+				continue
+			for case_sensitive, regex, candidates in matchers:
+				haystack = text if case_sensitive else text.lower()
+				match = regex.search(haystack)
+				while match:
+					pos = match.start()
+					for term, rule_ids in candidates[haystack[pos]]:
+						if haystack.startswith(term, pos):
+							for idx in rule_ids:
+								found[idx].add(term)
+					match = regex.search(haystack, pos + 1)
+		return [idx for idx in sorted(found) if len(found[idx]) >= self.required[idx]]
+
+	def keep(self, doc) -> bool:
+		"""
+		Check a document against the rule set and update the hit counters.
+		"""
+		fired = self._fired_ids(doc)
+		self.checked += 1
+		self.hits.update(self.rules[idx]["name"] for idx in fired)
+		excluded = any(idx not in self.include for idx in fired)
+		included = not self.include or any(idx in self.include for idx in fired)
+		if excluded or not included:
+			self.rejected += 1
+			return False
+		return True
+
+	def report(self) -> str:
+		lines = [f"{self.name}: kept {self.checked - self.rejected}/{self.checked}"]
+		for rule in self.rules:
+			action = rule.get("action", "exclude")
+			lines.append(f"  {rule['name']} ({action}): {self.hits[rule['name']]}")
+		return "\n".join(lines)
+
+
+def load_filters(path=DEFAULT_RULES_PATH) -> dict[str, KeywordFilter]:
+	"""
+	Compile every rule set in a JSON config of {rule set name: [rules]}.
+	"""
+	with open(path, "r") as f:
+		config = json.load(f)
+	return {name: KeywordFilter(rules, name=name) for name, rules in config.items()}
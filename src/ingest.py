@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+
+# Add parent directory to path to import from src.json_stream and src.urls
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.json_stream import iter_json_array
+from src.urls import SeenIndex, canonical_url
+
+
+def read_records(path):
+	"""
+	Yield the records of a JSONL file, or the elements of a JSON array file,
+	one at a time without loading the whole file.
+	"""
+	if not path.endswith(".jsonl"):
+		yield from iter_json_array(path)
+		return
+	with open(path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				yield json.loads(line)
+			except json.JSONDecodeError:
+				# A crash can leave a partially written last line
+				continue
+
+
+def records_path(path):
+	"""
+	`path` if it exists, otherwise the JSON array file written before the
+	move to JSONL (all_res.jsonl -> all_res.json), so older scrape
+	directories still load.
+	"""
+	if os.path.exists(path) or not path.endswith(".jsonl"):
+		return path
+	legacy = path[:-len(".jsonl")] + ".json"
+	return legacy if os.path.exists(legacy) else path
+
+
+def web_record(d):
+	# Apify website content crawler item
+	url = d.get("url", None)
+	content = d.get("text", None)
+	if not url or not content:
+		return None
+	title = d.get("title", "")
+	og_titles = [o.get("content", None) for o in d.get("openGraph", None) or [] if o.get("property", None) == "og:title"]
+	og_titles = [t for t in og_titles if t]
+	if len(og_titles) == 1:
+		title = og_titles[0]
+	return {"url": url, "title": title, "content": content}
+
+
+def pdf_record(d, titles):
+	# PDF text extraction item; titles maps canonical pdf URL to the SERP result title
+	url = d.get("pdfUrl", None)
+	if not url:
+		return None
+	content = d.get("extractedText", "").strip().replace("\n\n\n", "\n\n").replace("\t", " ")
+	if not len(content):
+		return None
+	return {"url": url, "title": titles.get(canonical_url(url), ""), "content": content}
+
+
+def transcript_record(d):
+	# YouTube transcript item
+	url = d.get("videoUrl", None)
+	text = d.get("text", None)
+	if not url or not text:
+		return None
+	return {"url": url, "title": d.get("videoTitle", None), "content": text}
+
+
+def linkedin_record(d):
+	# LinkedIn post item; url is the article the post shares, and
+	# post_url/post_id identify the post itself
+	content = d.get("content", None)
+	if not content:
+		return None
+	article = d.get("article", None) or {}
+	return {
+		"url": article.get("link", ""),
+		"title": article.get("title", ""),
+		"content": content,
+		"post_url": d.get("url", None) or d.get("postUrl", None) or "",
+		"post_id": str(d.get("urn", None) or d.get("id", None) or ""),
+		"date": (d.get("postedAt", None) or {}).get("date", ""),
+		"author_domain": article.get("subtitle", "")
+	}
+
+
+def ingest(records, out, normalizer=None, seen=None, key=lambda record: record["url"], corpus=None, doc_type=None) -> tuple[int, int]:
+	"""
+	Normalize raw records one at a time and write each new one to `out`, an
+	open JSONL file, as it arrives. Records the normalizer rejects (returns
+	None for) are dropped, as are records whose key `seen` (a SeenIndex,
+	comparing canonical URLs by default) already holds; pass the same index
+	to several calls to dedupe across inputs, or key=None to keep every
+	record. With a CorpusStore, written records that have a URL are also
+	stored there under `doc_type`.
+	Returns (records read, records written).
+	"""
+	seen = SeenIndex() if seen is None else seen
+	read = written = 0
+	for raw in records:
+		read += 1
+		record = normalizer(raw) if normalizer else raw
+		if record is None:
+			continue
+		if key is not None and not seen.add(key(record)):
+			continue
+		out.write(json.dumps(record) + "\n")
+		written += 1
+		if corpus is not None and record.get("url"):
+			corpus.put(record, doc_type)
+	if corpus is not None:
+		corpus.commit()
+	return read, written
@@ -0,0 +1,205 @@
+import json
+import re
+from typing import Any
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", flags=re.DOTALL)
+START_RE = re.compile(r"[{\[]")
+
+
+def _loads(text):
+	if orjson is not None:
+		return orjson.loads(text)
+	return json.loads(text)
+
+
+def parse_json(completion: str, allow_truncated=False) -> dict[str, Any] | list | None:
+	"""
+	Parse an LLM completion into a dict (or list).
+	Tries the text as-is, then the body of every markdown fence and finally
+	the whole text. Within each it looks for a JSON value at every "{" or
+	"[" (skipping prose such as "Sources [1-3]"), as written and with
+	trailing commas removed. Only with `allow_truncated` is a truncated
+	document cut back to its longest valid prefix with its open
+	arrays/objects closed; that result is missing whatever was cut off, so
+	by default a truncated completion returns None like any other failure.
+	"""
+	if not completion:
+		return None
+
+	try:
+		return _loads(completion)
+	except ValueError:
+		pass
+
+	texts = [fence.group(1) for fence in FENCE_RE.finditer(completion)] + [completion]
+	furthest = []
+	for text in texts:
+		found, start = _decode_first(text)
+		if found is not None:
+			return found
+		if start is not None:
+			furthest.append(text[start:])
+
+	if not allow_truncated:
+		return None
+	for text in furthest:
+		repaired = repair_truncated(strip_trailing_commas(text))
+		if repaired is None:
+			continue
+		try:
+			return _loads(repaired)
+		except ValueError:
+			continue
+	return None
+
+
+def _decode_first(text):
+	"""
+	The first JSON object in `text` (or failing that the first array), or
+	(None, start) where `start` is the candidate that parsed furthest before
+	failing (the likeliest truncated document).
+	"""
+	decoder = json.JSONDecoder()
+	first_array = None
+	best_start, best_pos = None, -1
+	resume = 0
+	for match in START_RE.finditer(text):
+		start = match.start()
+		# A start inside a value already read, or inside a candidate that
+		# failed further on, is not tried again
+		if start < resume:
+			continue
+		value = None
+		try:
+			value, end = decoder.raw_decode(text, start)
+		except ValueError as e:
+			pos = getattr(e, "pos", start + 1)
+			try:
+				value = decoder.raw_decode(strip_trailing_commas(text[start:]))[0]
+				# Offsets in the cleaned copy do not map back; the stray comma
+				# comes after everything the value holds up to that point
+				end = pos
+			except ValueError:
+				pass
+		if isinstance(value, dict):
+			return value, None
+		if value is not None:
+			# An array in prose is as likely a citation like [1]; keep looking
+			# for an object first
+			if first_array is None:
+				first_array = value
+			resume = max(resume, end)
+			continue
+		if pos > best_pos:
+			best_start, best_pos = start, pos
+		resume = max(resume, pos)
+	if first_array is not None:
+		return first_array, None
+	return None, best_start
+
+
+def strip_trailing_commas(text: str) -> str:
+	"""
+	Drop commas directly before a closing bracket, leaving string contents alone.
+	"""
+	out = []
+	in_string = False
+	escape = False
+	pending_comma = None
+	for char in text:
+		if in_string:
+			out.append(char)
+			if escape:
+				escape = False
+			elif char == "\\":
+				escape = True
+			elif char == '"':
+				in_string = False
+			continue
+		if pending_comma is not None:
+			if char in " \t\r\n":
+				pending_comma.append(char)
+				continue
+			if char not in "}]":
+				out.extend(pending_comma)
+			else:
+				# Keep the whitespace, lose the comma
+				out.extend(pending_comma[1:])
+			pending_comma = None
+		if char == ",":
+			pending_comma = [char]
+			continue
+		if char == '"':
+			in_string = True
+		out.append(char)
+	if pending_comma is not None:
+		out.extend(pending_comma)
+	return "".join(out)
+
+
+def repair_truncated(text: str) -> str | None:
+	"""
+	Cut a truncated JSON document back to its last complete value and close
+	every array/object still open at that point. Returns None if the text does
+	not start with an array or object.
+	"""
+	if not text or text[0] not in "{[":
+		return None
+
+	stack = []
+	in_string = False
+	escape = False
+	string_is_key = False
+	# Per open object: whether the next string is a key
+	expect_key = []
+	cut, cut_stack = None, None
+
+	for pos, char in enumerate(text):
+		if in_string:
+			if escape:
+				escape = False
+			elif char == "\\":
+				escape = True
+			elif char == '"':
+				in_string = False
+				if not string_is_key:
+					cut, cut_stack = pos + 1, list(stack)
+			continue
+
+		if char == '"':
+			in_string = True
+			string_is_key = bool(stack) and stack[-1] == "{" and expect_key[-1]
+		elif char in "{[":
+			stack.append(char)
+			if char == "{":
+				expect_key.append(True)
+			# An empty array is a fine stand-in, but an empty nested object
+			# would leave a hollow element behind
+			if char == "[" or len(stack) == 1:
+				cut, cut_stack = pos + 1, list(stack)
+		elif char in "}]":
+			if not stack:
+				break
+			if stack.pop() == "{":
+				expect_key.pop()
+			cut, cut_stack = pos + 1, list(stack)
+			if not stack:
+				# The document is complete; anything after it is ignored
+				break
+		elif char == ",":
+			cut, cut_stack = pos, list(stack)
+			if stack and stack[-1] == "{":
+				expect_key[-1] = True
+		elif char == ":":
+			if stack and stack[-1] == "{":
+				expect_key[-1] = False
+
+	if cut is None:
+		return None
+	closers = "".join("}" if opener == "{" else "]" for opener in reversed(cut_stack))
+	return strip_trailing_commas(text[:cut].rstrip().rstrip(",") + closers)
@@ -0,0 +1,115 @@
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+# Add parent directory to path to import from src.json_repair
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.json_repair import parse_json
+
+
+def legacy_parse_json(completion):
+	# The parser json_repair replaced, kept for comparison
+	try:
+		return json.loads(completion)
+	except Exception:
+		m = re.search(r"(\{.*\}|\[.*\])", completion, flags=re.DOTALL)
+		candidate = m.group(1) if m else completion
+		for attempt in [candidate, re.sub(r",(\s*[\]\}])", r"\1", candidate)]:
+			try:
+				return json.loads(attempt)
+			except json.JSONDecodeError:
+				continue
+		return None
+
+
+def add_trailing_commas(text):
+	"""
+	Put a comma after the last value of every non-empty array/object,
+	leaving string contents alone.
+	"""
+	out = []
+	in_string = False
+	escape = False
+	last = ""
+	for char in text:
+		if in_string:
+			if escape:
+				escape = False
+			elif char == "\\":
+				escape = True
+			elif char == '"':
+				in_string = False
+		elif char == '"':
+			in_string = True
+		elif char in "}]" and last not in "{[,":
+			# Insert right after the last significant character
+			idx = len(out)
+			while out[idx - 1] in " \t\r\n":
+				idx -= 1
+			out.insert(idx, ",")
+		out.append(char)
+		if not in_string and char not in " \t\r\n" or char == '"':
+			last = char
+	return "".join(out)
+
+
+def fuzz_cases(completion, rng):
+	"""
+	Damaged variants of a saved completion: fenced, after another fenced
+	block, with prose around it (including bracketed prose), with trailing
+	commas and truncated at random points.
+	"""
+	yield "clean", completion
+	yield "fenced", f"```json\n{completion}\n```"
+	yield "second_fence", f"```\nnote: sources reviewed below\n```\n```json\n{completion}\n```"
+	yield "prose", f"Here is the JSON:\n{completion}\nLet me know if you need more."
+	yield "bracket_prose", f"Sources [1-3] reviewed: {completion}"
+	yield "trailing_commas", add_trailing_commas(completion)
+	for _ in range(5):
+		yield "truncated", completion[:rng.randint(1, len(completion) - 1)]
+
+
+def benchmark(path, seed=0):
+	"""
+	Fuzz the parsers with damaged variants of the completions saved in a
+	JSONL file (one JSON object per line, e.g. final_facts2.jsonl). Every
+	variant but a truncated one must parse to the original object;
+	truncated ones count as recovered when some object comes back.
+	"""
+	rng = random.Random(seed)
+	cases = []
+	with open(path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			expected = json.loads(line)
+			completion = json.dumps(expected, indent=2)
+			cases.extend((kind, text, expected) for kind, text in fuzz_cases(completion, rng))
+
+	parsers = [
+		("legacy", legacy_parse_json),
+		("strict", parse_json),
+		("repair", lambda text: parse_json(text, allow_truncated=True))
+	]
+	for name, parser in parsers:
+		correct = Counter()
+		total = Counter()
+		start_time = time.time()
+		for kind, text, expected in cases:
+			total[kind] += 1
+			result = parser(text)
+			if result == expected or kind == "truncated" and isinstance(result, dict):
+				correct[kind] += 1
+		elapsed = time.time() - start_time
+		summary = ", ".join(f"{kind} {correct[kind]}/{total[kind]}" for kind in total)
+		print(f"{name}: {sum(correct.values())}/{len(cases)} correct in {elapsed:.2f}s ({summary})")
+
+
+if __name__ == "__main__":
+	benchmark(sys.argv[1] if len(sys.argv) > 1 else "final_facts2.jsonl")
@@ -0,0 +1,136 @@
+import json
+import re
+
+# The only characters that change the scanner's state
+STRUCTURAL_RE = re.compile(r'["\\{}\[\],]')
+
+
+class ArrayItemParser:
+	"""
+	Incremental scanner for a JSON document that arrives in pieces, e.g. a
+	streamed LLM completion or a large file read in blocks. Each element of the
+	watched arrays is decoded and returned by `feed` as soon as its closing
+	bracket arrives, so elements survive even if the input is cut off.
+	`keys` names the top-level arrays to watch in a root object (such as
+	"excerpts"); keys=None watches the root array itself. Text before the root
+	value (markdown fences, prose) is ignored. Only objects, arrays and
+	strings are returned: bare numbers, true/false and null elements are
+	skipped. Completed elements are also collected in `items` unless
+	keep=False.
+	"""
+
+	def __init__(self, keys, keep=True):
+		self.root = keys is None
+		self.keys = set(keys or [])
+		self.keep = keep
+		self.items = {None: []} if self.root else {key: [] for key in self.keys}
+		# Unconsumed tail of the input; only the element being scanned is kept
+		self.text = ""
+		self.stack = []
+		self.in_string = False
+		self.escape_pos = None
+		self.string_start = None
+		self.last_key = None
+		self.watched = None
+		self.item_start = None
+
+	def feed(self, chunk) -> list[tuple[str, object]]:
+		"""
+		Consume the next piece of text; return (key, element) pairs completed by it.
+		"""
+		start = len(self.text)
+		self.text += chunk
+		completed = []
+		text = self.text
+		root_opener = "[" if self.root else "{"
+		for match in STRUCTURAL_RE.finditer(text, start):
+			pos = match.start()
+			char = text[pos]
+			if self.in_string:
+				if pos == self.escape_pos:
+					continue
+				if char == "\\":
+					self.escape_pos = pos + 1
+				elif char == '"':
+					self.in_string = False
+					if not self.root and len(self.stack) == 1:
+						# A string directly inside the root object; remember it in
+						# case it turns out to be the key of a watched array
+						self.last_key = text[self.string_start + 1:pos]
+					elif self._at_item_level() and self.item_start == self.string_start:
+						self._emit(text, pos, completed)
+				continue
+
+			if not self.stack and char != root_opener:
+				continue
+			if char == '"':
+				self.in_string = True
+				self.string_start = pos
+				if self._at_item_level() and self.item_start is None:
+					self.item_start = pos
+			elif char in "{[":
+				if self._at_item_level() and self.item_start is None:
+					self.item_start = pos
+				self.stack.append(char)
+				if not self.root and len(self.stack) == 2 and char == "[" and self.last_key in self.keys:
+					self.watched = self.last_key
+			elif char in "}]":
+				if self.stack:
+					self.stack.pop()
+				if not self.root and len(self.stack) == 1:
+					self.watched = None
+					self.item_start = None
+				elif self._at_item_level() and self.item_start is not None:
+					self._emit(text, pos, completed)
+			elif char == "," and self._at_item_level():
+				self.item_start = None
+		self._trim()
+		return completed
+
+	def _at_item_level(self):
+		if self.root:
+			return len(self.stack) == 1
+		return self.watched is not None and len(self.stack) == 2
+
+	def _emit(self, text, end, completed):
+		try:
+			item = json.loads(text[self.item_start:end + 1])
+		except json.JSONDecodeError:
+			item = None
+		if item is not None:
+			if self.keep:
+				self.items[self.watched].append(item)
+			completed.append((self.watched, item))
+		self.item_start = None
+
+	def _trim(self):
+		# Drop text that no open element or string can refer back to
+		keep = len(self.text)
+		if self.item_start is not None:
+			keep = min(keep, self.item_start)
+		if self.in_string:
+			keep = min(keep, self.string_start)
+		if keep:
+			self.text = self.text[keep:]
+			if self.item_start is not None:
+				self.item_start -= keep
+			if self.string_start is not None:
+				self.string_start -= keep
+			if self.escape_pos is not None:
+				self.escape_pos -= keep
+
+
+def iter_json_array(path, block_size=1 << 20):
+	"""
+	Yield the object, array and string elements of a file holding one JSON
+	array (scalar elements are skipped, see ArrayItemParser), reading it in
+	blocks so memory stays proportional to the largest element, not the file.
+	"""
+	parser = ArrayItemParser(None, keep=False)
+	with open(path, "r") as f:
+		while True:
+			block = f.read(block_size)
+			if not block:
+				break
+			for _, item in parser.feed(block):
+				yield item
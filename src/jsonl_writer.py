@@ -0,0 +1,143 @@
+import asyncio
+import glob
+import json
+import os
+import time
+
+
+def segment_paths(path) -> list[str]:
+	"""
+	All files written for `path` in order: the base file (if any) followed by
+	its numbered segments, e.g. facts.jsonl, facts.00001.jsonl, ...
+	"""
+	stem, ext = os.path.splitext(path)
+	paths = [path] if os.path.exists(path) else []
+	return paths + sorted(glob.glob(f"{glob.escape(stem)}.[0-9][0-9][0-9][0-9][0-9]{ext}"))
+
+
+class JsonlWriter:
+	"""
+	Single writer task that owns an append-mode JSONL file and is fed through
+	an asyncio queue. Lines are written in batches: whatever is queued when
+	the writer gets to it (up to `flush_lines` lines) is written and flushed
+	at once, so a producer never waits on a timer, and the file is fsynced
+	every `fsync_interval` seconds. With `max_segment_bytes` set,
+	output rolls over to numbered segment files next to `path`. If the
+	writer task fails, every pending and later write() raises its error.
+
+		async with JsonlWriter("facts.jsonl") as writer:
+			await writer.write(record)
+	"""
+
+	def __init__(self, path, flush_lines=100, fsync_interval=10.0, max_segment_bytes=None):
+		self.path = path
+		self.flush_lines = flush_lines
+		self.fsync_interval = fsync_interval
+		self.max_segment_bytes = max_segment_bytes
+		self.queue = asyncio.Queue()
+		self.task = None
+		self.file = None
+		self.segment = 0
+		self.error = None
+		self.lines_written = 0
+		self.last_fsync = time.monotonic()
+
+	async def __aenter__(self):
+		self.start()
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.close()
+
+	def start(self):
+		if self.max_segment_bytes:
+			existing = segment_paths(self.path)
+			self.segment = len([p for p in existing if p != self.path])
+		self._open_next()
+		self.task = asyncio.create_task(self._run())
+
+	async def write(self, record):
+		"""
+		Queue a record and wait until the batch holding it has been flushed.
+		"""
+		if self.error is not None:
+			raise self.error
+		future = asyncio.get_running_loop().create_future()
+		self.queue.put_nowait((json.dumps(record) + "\n", future))
+		await future
+
+	async def close(self):
+		self.queue.put_nowait(None)
+		try:
+			await self.task
+			await self._fsync()
+		finally:
+			self.file.close()
+
+	def _segment_path(self):
+		if not self.max_segment_bytes:
+			return self.path
+		stem, ext = os.path.splitext(self.path)
+		return f"{stem}.{self.segment:05d}{ext}"
+
+	def _open_next(self):
+		if self.max_segment_bytes:
+			self.segment += 1
+		self.file = open(self._segment_path(), "a")
+
+	async def _fsync(self):
+		self.file.flush()
+		await asyncio.get_running_loop().run_in_executor(None, os.fsync, self.file.fileno())
+		self.last_fsync = time.monotonic()
+
+	async def _run(self):
+		batch = []
+		try:
+			await self._write_batches(batch)
+		except BaseException as e:
+			self._fail(batch, e)
+			raise
+
+	def _fail(self, batch, error):
+		# Nothing is written after this; wake every caller still waiting
+		self.error = error if isinstance(error, Exception) else RuntimeError(f"JSONL writer for {self.path} stopped")
+		pending = list(batch)
+		while not self.queue.empty():
+			entry = self.queue.get_nowait()
+			if entry is not None:
+				pending.append(entry)
+		for _, future in pending:
+			if not future.done():
+				future.set_exception(self.error)
+
+	async def _write_batches(self, batch):
+		closing = False
+		while not closing:
+			batch.clear()
+			entry = await self.queue.get()
+			# Let producers that are ready queue their lines too; the batch
+			# then ends as soon as the queue drains
+			await asyncio.sleep(0)
+			while True:
+				if entry is None:
+					closing = True
+					break
+				batch.append(entry)
+				if len(batch) >= self.flush_lines or self.queue.empty():
+					break
+				entry = self.queue.get_nowait()
+			if not batch:
+				continue
+
+			self.file.write("".join(line for line, _ in batch))
+			self.file.flush()
+			self.lines_written += len(batch)
+			if time.monotonic() - self.last_fsync >= self.fsync_interval:
+				await self._fsync()
+			if self.max_segment_bytes and self.file.tell() >= self.max_segment_bytes:
+				await self._fsync()
+				self.file.close()
+				self._open_next()
+			for _, future in batch:
+				if not future.done():
+					future.set_result(None)
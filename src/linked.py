@@ -1,22 +1,18 @@
-import json
+import os
+import sys
 
-data = []
-with open("data/linkedin.json", "r") as f:
-	data = json.load(f)
+# Add parent directory to path to import from src.ingest and src.corpus
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-relevant = [d for d in data if d.get('content', None) and "ketan patel" in d.get("content", "").lower()]
+from src.ingest import read_records, ingest, linkedin_record
+from src.corpus import CorpusStore
 
-clean = []
+relevant = (d for d in read_records("data/linkedin.json") if "ketan patel" in (d.get("content", None) or "").lower())
 
-for r in relevant:
-	obj = {
-		"date": r.get("postedAt", {}).get("date", ""),
-		"content": r.get("content", ""),
-		"article_title": r.get("article", {}).get("title", ""),
-		"author_domain": r.get("article", {}).get("subtitle", ""),
-		"article_url": r.get("article", {}).get("link", "")
-	}
-	clean.append(obj)
+corpus = CorpusStore()
+with open("clean_linkedin.jsonl", "w") as out:
+	# Posts are not deduplicated; several can share an article
+	read, written = ingest(relevant, out, linkedin_record, key=None, corpus=corpus, doc_type="linkedin")
 
-with open("clean_linkedin.json", "w") as f:
-	f.write(json.dumps(clean))
+print(f"Relevant posts: {written}")
+corpus.close()
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import sys
+import time
+import httpx
+from openai import AsyncOpenAI, APITimeoutError, APIStatusError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add parent directory to path to import from src.ratelimit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cache import ResponseCache
+from src.ratelimit import RateLimiter, estimate_tokens
+
+MODEL = "gpt-5.2"
+
+# Size of the shared HTTP connection pool. Requests are plain coroutines, so
+# this (not a thread pool) is what bounds the number of in-flight calls.
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "512"))
+
+# Provider budgets shared by every caller in this process
+limiter = RateLimiter(
+	tpm=int(os.getenv("LLM_TPM", "2000000")),
+	rpm=int(os.getenv("LLM_RPM", "5000"))
+)
+
+# Attempts made after a 429/5xx response before giving up on a call
+MAX_THROTTLE_RETRIES = 5
+
+# Completed responses, so re-runs over unchanged prompts skip the API. The
+# database is only created once a call looks something up. Callers that
+# reject a response should drop it with cache.invalidate(model, prompt).
+cache = ResponseCache(
+	os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite"),
+	max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+)
+
+_client = None
+
+
+class LLMTimeout(Exception):
+	pass
+
+
+def get_client() -> AsyncOpenAI:
+	"""
+	Return the process-wide async client, creating it on first use so that
+	the pooled HTTP connections are bound to the running event loop.
+	"""
+	global _client
+	if _client is None:
+		_client = AsyncOpenAI(
+			api_key=os.getenv("OPENAI_API_KEY"),
+			max_retries=0,
+			http_client=httpx.AsyncClient(
+				limits=httpx.Limits(
+					max_connections=MAX_CONNECTIONS,
+					max_keepalive_connections=MAX_CONNECTIONS
+				)
+			)
+		)
+	return _client
+
+
+async def close_client():
+	global _client
+	if _client is not None:
+		await _client.close()
+		_client = None
+
+
+async def call_gpt(prompt, timeout=300.0, connect_timeout=10.0, model=MODEL, use_cache=True):
+	"""
+	Send a prompt and return the output text.
+	`timeout` is a hard deadline for each attempt in seconds; `connect_timeout`
+	bounds opening a pooled connection. Every attempt waits on the shared rate
+	limiter, and 429/5xx responses are retried after its backoff. Raises
+	LLMTimeout when the deadline is hit and lets any other API error propagate.
+	With `use_cache`, a response already stored for the same model + prompt is
+	returned without calling the API.
+	"""
+	if use_cache:
+		cached = cache.get(model, prompt)
+		if cached is not None:
+			return cached
+
+	async def request():
+		try:
+			response = await asyncio.wait_for(
+				get_client().responses.create(
+					model=model,
+					input=prompt,
+					timeout=httpx.Timeout(timeout, connect=connect_timeout)
+				),
+				timeout=timeout
+			)
+		except (asyncio.TimeoutError, APITimeoutError):
+			raise LLMTimeout(f"GPT API call took longer than {timeout:.0f}s")
+		return response.output_text
+
+	output_text = await _send_limited(prompt, request)
+	if use_cache and output_text:
+		cache.put(model, prompt, output_text)
+	return output_text
+
+
+async def stream_gpt(prompt, on_text, timeout=300.0, connect_timeout=10.0, model=MODEL, use_cache=True):
+	"""
+	Stream a response, passing each text delta to `on_text` as it arrives.
+	Returns (output_text, completed). When the `timeout` deadline is hit the
+	text generated so far is returned with completed=False instead of being
+	thrown away. Only completed responses are cached.
+	"""
+	if use_cache:
+		cached = cache.get(model, prompt)
+		if cached is not None:
+			on_text(cached)
+			return cached, True
+
+	async def request():
+		deltas = []
+
+		async def consume():
+			stream = await get_client().responses.create(
+				model=model,
+				input=prompt,
+				stream=True,
+				timeout=httpx.Timeout(timeout, connect=connect_timeout)
+			)
+			async for event in stream:
+				if event.type == "response.output_text.delta":
+					deltas.append(event.delta)
+					on_text(event.delta)
+
+		try:
+			await asyncio.wait_for(consume(), timeout=timeout)
+		except (asyncio.TimeoutError, APITimeoutError):
+			if not deltas:
+				raise LLMTimeout(f"GPT API call took longer than {timeout:.0f}s")
+			return "".join(deltas), False
+		return "".join(deltas), True
+
+	output_text, completed = await _send_limited(prompt, request)
+	if use_cache and completed and output_text:
+		cache.put(model, prompt, output_text)
+	return output_text, completed
+
+
+async def _send_limited(prompt, request):
+	"""
+	Run `await request()` under the shared rate limiter, retrying 429/5xx
+	responses after the limiter's backoff.
+	"""
+	tokens = estimate_tokens(prompt)
+	for attempt in range(MAX_THROTTLE_RETRIES + 1):
+		await limiter.acquire(tokens)
+		try:
+			result = await request()
+		except APIStatusError as e:
+			if e.status_code != 429 and e.status_code < 500:
+				raise
+			limiter.on_throttle(_retry_after(e))
+			if attempt == MAX_THROTTLE_RETRIES:
+				raise
+			continue
+		limiter.on_success()
+		return result
+
+
+def _retry_after(error):
+	try:
+		return float(error.response.headers.get("retry-after"))
+	except (TypeError, ValueError):
+		return None
+
+
+async def get_gpt(prompt, timeout=300.0, connect_timeout=10.0, model=MODEL, use_cache=True):
+	"""
+	Logging wrapper around call_gpt that returns None on timeout or error.
+	"""
+	start_time = time.time()
+	try:
+		print(f"[{time.strftime('%H:%M:%S')}] Calling GPT API with prompt length: {len(prompt)}")
+		output_text = await call_gpt(prompt, timeout=timeout, connect_timeout=connect_timeout, model=model, use_cache=use_cache)
+		elapsed = time.time() - start_time
+		print(f"[{time.strftime('%H:%M:%S')}] Got response from GPT API (took {elapsed:.1f}s)")
+		return output_text
+	except LLMTimeout as e:
+		elapsed = time.time() - start_time
+		print(f"[{time.strftime('%H:%M:%S')}] Timeout: {e} (elapsed: {elapsed:.1f}s)")
+		return None
+	except Exception as e:
+		elapsed = time.time() - start_time
+		print(f"[{time.strftime('%H:%M:%S')}] Error in get_gpt after {elapsed:.1f}s: {e}")
+		return None
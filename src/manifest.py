@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+# Add parent directory to path to import from src.jsonl_writer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.jsonl_writer import segment_paths
+
+STATUS_DONE = "done"
+STATUS_EMPTY = "empty"
+STATUS_FAILED = "failed"
+STATUS_TIMED_OUT = "timed_out"
+# The chunk kept failing and was bisected; its halves are tracked separately
+STATUS_SPLIT = "split"
+# Not a chunk: document keys whose earlier output no longer applies
+STATUS_RETIRED = "retired"
+
+# Chunks in these states are skipped when a run is resumed
+COMPLETE_STATUSES = {STATUS_DONE, STATUS_EMPTY}
+
+
+def item_key(item) -> str:
+	url = item.get("url", "")
+	# Parts of a split document share a URL; keep them distinct
+	if "char_offset" in item:
+		return f"{url}#chars:{item['char_offset']}"
+	return url
+
+
+def base_key(key) -> str:
+	return key.split("#chars:", 1)[0]
+
+
+def chunk_urls(chunk) -> list[str]:
+	return sorted(item_key(item) for item in chunk)
+
+
+def chunk_id(chunk) -> str:
+	return hashlib.sha256("\n".join(chunk_urls(chunk)).encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(chunk) -> str:
+	return hashlib.sha256(json.dumps(chunk, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def document_hash(item) -> str:
+	return hashlib.sha256(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def chunk_documents(chunk) -> dict:
+	return {item_key(item): document_hash(item) for item in chunk}
+
+
+class RunManifest:
+	"""
+	Append-only JSONL record of every chunk attempted by an extraction run.
+	A chunk is identified by its URL set; the latest record for a chunk wins,
+	and a chunk only counts as complete if its content hash is unchanged.
+	Each entry also lists the hash of every document in the chunk, so a later
+	run can tell which documents are new or changed however they get packed,
+	and which output lines a changed document has superseded (is_current).
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.entries = {}
+		# item_key -> the entry holding the current output for that document:
+		# the latest complete one, or the latest attempt if none completed
+		self.holder = {}
+		# item_key -> document hashes seen in complete chunks
+		self.known = {}
+		# item_keys whose output was retired and not produced again since
+		self.retired = set()
+		if os.path.exists(path):
+			with open(path, "r") as f:
+				for line in f:
+					line = line.strip()
+					if not line:
+						continue
+					try:
+						entry = json.loads(line)
+					except json.JSONDecodeError:
+						# A crash can leave a partially written last line
+						continue
+					self._add(entry)
+
+	def status(self, chunk):
+		"""
+		Latest recorded status of a chunk, or None if it was never recorded or
+		its content has changed since.
+		"""
+		entry = self.entries.get(chunk_id(chunk))
+		if not entry or entry["content_hash"] != content_hash(chunk):
+			return None
+		return entry["status"]
+
+	def is_complete(self, chunk) -> bool:
+		return self.status(chunk) in COMPLETE_STATUSES
+
+	def record(self, chunk, status, **extra):
+		entry = {
+			"chunk_id": chunk_id(chunk),
+			"urls": chunk_urls(chunk),
+			"content_hash": content_hash(chunk),
+			"status": status,
+			"updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+			"documents": chunk_documents(chunk),
+			**extra
+		}
+		self._append(entry)
+
+	def retire(self, keys):
+		"""
+		Record that the output held for these document keys no longer
+		applies (e.g. parts of a document that is now split differently).
+		Every line that holds one of them stops being current.
+		"""
+		keys = sorted(set(keys) & set(self.holder))
+		if keys:
+			self._append({
+				"status": STATUS_RETIRED,
+				"updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+				"documents": dict.fromkeys(keys)
+			})
+
+	def document_status(self, item) -> str:
+		"""
+		"unchanged" if this exact document was part of a complete chunk whose
+		output is still current, "changed" if only other versions of it were
+		(or that output was superseded), otherwise "new".
+		"""
+		key = item_key(item)
+		entry = self.holder.get(key)
+		if entry and entry["status"] in COMPLETE_STATUSES and entry["documents"][key] == document_hash(item) and self._intact(entry):
+			return "unchanged"
+		return "changed" if key in self.known else "new"
+
+	def stale_keys(self, items) -> list[str]:
+		"""
+		Document keys on record for the URLs of `items` that none of `items`
+		has any more: parts of a document that is now split differently, or
+		no longer split at all.
+		"""
+		current = {item_key(item) for item in items}
+		urls = {base_key(key) for key in current}
+		return [key for key in self.holder if base_key(key) in urls and key not in current]
+
+	def document_keys(self, urls) -> list[str]:
+		"""
+		Keys on record for these URLs, whole or in parts; e.g. to retire the
+		documents the relevance pre-filter now rejects.
+		"""
+		urls = set(urls)
+		return [key for key in self.holder if base_key(key) in urls]
+
+	def companions(self, keys) -> set[str]:
+		"""
+		Keys of the other documents whose current output shares a line with
+		any of `keys`. Once those documents are processed again that line is
+		superseded, so its companions have to be processed with them.
+		"""
+		found = set()
+		for key in keys:
+			entry = self.holder.get(key)
+			if entry and entry["status"] in COMPLETE_STATUSES:
+				found.update(other for other in entry["documents"] if self._holds(entry, other))
+		return found - set(keys)
+
+	def is_current(self, line) -> bool:
+		"""
+		Whether an output line (tagged with chunk_id, content_hash and
+		documents when it was written) still holds the current output for
+		every document in it. A line stops being current when one of its
+		documents has been processed again, or retired.
+		"""
+		documents = line.get("documents")
+		if documents is None:
+			# Lines written before they carried their document hashes
+			entry = self.entries.get(line.get("chunk_id"))
+			documents = entry.get("documents") if entry else None
+			if not documents:
+				return True
+		for key, doc_hash in documents.items():
+			entry = self.holder.get(key)
+			if entry is None:
+				if key in self.retired:
+					return False
+				continue
+			if entry["chunk_id"] != line.get("chunk_id") or entry["documents"].get(key) != doc_hash:
+				return False
+			if line.get("content_hash", entry["content_hash"]) != entry["content_hash"]:
+				return False
+			# A partial result is superseded once the same chunk completes
+			if line.get("partial") and entry["status"] in COMPLETE_STATUSES:
+				return False
+		return True
+
+	def current_lines(self, path):
+		"""
+		Yield the output lines of `path` that are still current.
+		"""
+		for record in read_lines(path):
+			if self.is_current(record):
+				yield record
+
+	def compact(self, path) -> tuple[int, int]:
+		"""
+		Rewrite `path` (and its numbered segments) with only the current
+		lines, so readers that do not go through current_lines() see the
+		merged store. Returns (kept, dropped).
+		"""
+		kept = dropped = 0
+		for segment in segment_paths(path):
+			tmp_path = f"{segment}.tmp"
+			with open(tmp_path, "w") as f:
+				for record in _read_file(segment):
+					if self.is_current(record):
+						f.write(json.dumps(record) + "\n")
+						kept += 1
+					else:
+						dropped += 1
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp_path, segment)
+		return kept, dropped
+
+	def _holds(self, entry, key) -> bool:
+		holder = self.holder.get(key)
+		return holder is not None and (holder["chunk_id"], holder["content_hash"]) == (entry["chunk_id"], entry["content_hash"])
+
+	def _intact(self, entry) -> bool:
+		return all(self._holds(entry, key) for key in entry["documents"])
+
+	def _append(self, entry):
+		self._add(entry)
+		with open(self.path, "a") as f:
+			f.write(json.dumps(entry) + "\n")
+
+	def _add(self, entry):
+		if entry["status"] == STATUS_RETIRED:
+			for key in entry["documents"]:
+				self.holder.pop(key, None)
+				self.retired.add(key)
+			return
+		self.entries[entry["chunk_id"]] = entry
+		if entry["status"] == STATUS_SPLIT:
+			return
+		complete = entry["status"] in COMPLETE_STATUSES
+		# Entries written before per-document hashes were recorded have none
+		for key, doc_hash in entry.get("documents", {}).items():
+			held = self.holder.get(key)
+			if complete or held is None or held["status"] not in COMPLETE_STATUSES:
+				self.holder[key] = entry
+				self.retired.discard(key)
+			if complete:
+				self.known.setdefault(key, set()).add(doc_hash)
+
+	def summary(self) -> dict:
+		return dict(Counter(entry["status"] for entry in self.entries.values()))
+
+
+def manifest_path(path) -> str:
+	# final_facts2.jsonl -> final_facts2.manifest.jsonl
+	stem, ext = os.path.splitext(path)
+	return f"{stem}.manifest{ext}"
+
+
+def read_lines(path):
+	"""
+	Yield the records of a JSONL file written by JsonlWriter, including its
+	numbered segments, skipping a partially written last line.
+	"""
+	for segment in segment_paths(path):
+		yield from _read_file(segment)
+
+
+def _read_file(path):
+	with open(path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				yield json.loads(line)
+			except json.JSONDecodeError:
+				continue
+
+
+def read_current(path):
+	"""
+	Yield the current lines of an output file kept by a RunManifest (see
+	manifest_path); every line when it has no manifest.
+	"""
+	if os.path.exists(manifest_path(path)):
+		yield from RunManifest(manifest_path(path)).current_lines(path)
+	else:
+		yield from read_lines(path)
+
+
+if __name__ == "__main__":
+	# Drop superseded lines from an output file, e.g.
+	# python src/manifest.py final_facts2.jsonl
+	out_path = sys.argv[1]
+	kept, dropped = RunManifest(manifest_path(out_path)).compact(out_path)
+	print(f"{out_path}: kept {kept} lines, dropped {dropped} superseded ones")
@@ -0,0 +1,91 @@
+import re
+import zlib
+from collections import defaultdict
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def shingle_hashes(text, shingle_size=5) -> np.ndarray:
+	"""
+	32-bit hashes of the word k-shingles of a text, with case and punctuation
+	ignored. Texts shorter than one shingle hash as a single shingle.
+	"""
+	words = WORD_RE.findall(text.casefold())
+	if len(words) <= shingle_size:
+		grams = {" ".join(words)}
+	else:
+		grams = {" ".join(words[idx:idx + shingle_size]) for idx in range(len(words) - shingle_size + 1)}
+	return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def choose_bands(num_perm, threshold) -> tuple[int, int]:
+	"""
+	Pick (bands, rows) with bands * rows <= num_perm whose LSH S-curve
+	threshold, (1 / bands) ** (1 / rows), lies closest to `threshold`.
+	"""
+	best = None
+	for rows in range(1, num_perm + 1):
+		bands = num_perm // rows
+		error = abs((1 / bands) ** (1 / rows) - threshold)
+		if best is None or error < best[0]:
+			best = (error, bands, rows)
+	return best[1], best[2]
+
+
+class MinHasher:
+	def __init__(self, num_perm=128, seed=1):
+		rng = np.random.RandomState(seed)
+		self.num_perm = num_perm
+		self.a = rng.randint(1, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+		self.b = rng.randint(0, int(MERSENNE_PRIME), num_perm, dtype=np.uint64)
+
+	def signature(self, hashes) -> np.ndarray:
+		if not len(hashes):
+			return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+		permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+		return permuted.min(axis=0)
+
+
+def find_clusters(texts, threshold=0.8, num_perm=128, shingle_size=5) -> list[list[int]]:
+	"""
+	Group texts whose estimated Jaccard similarity (over word shingles) is at
+	least `threshold`, using MinHash signatures and locality-sensitive hashing.
+	Each text is compared only against the first member of every LSH bucket it
+	falls into, so the work grows linearly with the number of texts.
+	Returns clusters of indices into `texts`, singletons included, in order of
+	first appearance.
+	"""
+	hasher = MinHasher(num_perm)
+	bands, rows = choose_bands(num_perm, threshold)
+	signatures = [hasher.signature(shingle_hashes(text, shingle_size)) for text in texts]
+
+	parent = list(range(len(texts)))
+
+	def find(idx):
+		while parent[idx] != idx:
+			parent[idx] = parent[parent[idx]]
+			idx = parent[idx]
+		return idx
+
+	for band in range(bands):
+		buckets = {}
+		start, end = band * rows, (band + 1) * rows
+		for idx, signature in enumerate(signatures):
+			key = signature[start:end].tobytes()
+			first = buckets.setdefault(key, idx)
+			if first == idx:
+				continue
+			root_a, root_b = find(first), find(idx)
+			if root_a == root_b:
+				continue
+			if np.mean(signatures[first] == signature) >= threshold:
+				parent[max(root_a, root_b)] = min(root_a, root_b)
+
+	clusters = defaultdict(list)
+	for idx in range(len(texts)):
+		clusters[find(idx)].append(idx)
+	return [clusters[root] for root in sorted(clusters)]
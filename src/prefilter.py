@@ -0,0 +1,129 @@
+import json
+import math
+import os
+import re
+import sys
+
+# Add parent directory to path to import from src.chunking
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chunking import content_key
+
+# Evidence that a document is about the subject. Terms match case-insensitively
+# as whole words; a trailing * marks a stem that matches any word it starts
+# ("geopolitic*" matches "geopolitics" and "geopolitical")
+POSITIVE_TERMS = {
+	"ketan patel": 2.0,
+	"ketan": 0.5,
+	"greater pacific capital": 5.0,
+	"greater pacific": 3.0,
+	"force for good": 4.0,
+	"master strategist": 4.0,
+	"goldman sachs": 3.0,
+	"strategy group": 1.5,
+	"kpmg": 2.0,
+	"london school of economics": 2.0,
+	"lse": 1.0,
+	"private equity": 1.0,
+	"sovereign wealth": 1.0,
+	"geopolitic*": 1.0,
+	"strategist": 1.0
+}
+
+# Evidence that a document is about a namesake (doctors, founders, academics)
+NEGATIVE_TERMS = {
+	"dr. ketan patel": -4.0,
+	"dr ketan patel": -4.0,
+	"professor ketan patel": -3.0,
+	"ketan patel, phd": -3.0,
+	"ketan patel phd": -3.0,
+	"physician*": -3.0,
+	"surgeon*": -3.0,
+	"surgery": -2.0,
+	"cardiolog*": -3.0,
+	"dentist*": -3.0,
+	"dental": -2.0,
+	# Whole words: "hospitality" and "patient capital" are not medical
+	"hospital": -2.0,
+	"hospitals": -2.0,
+	"clinic": -2.0,
+	"clinics": -2.0,
+	"clinical": -2.0,
+	"patients": -2.0,
+	"pharma*": -2.0,
+	"medical": -1.5,
+	"realtor*": -2.0,
+	"real estate agent": -2.0,
+	"software engineer": -2.0,
+	"blockchain": -1.5,
+	"crunchbase": -1.5
+}
+
+# Documents scoring below this are dropped before any prompt is built
+THRESHOLD = float(os.getenv("PREFILTER_THRESHOLD", "1.0"))
+
+
+def term_pattern(term) -> str:
+	# A stem ("cardiolog*") may run on into the rest of a word; anything else
+	# has to end at a word boundary
+	if term.endswith("*"):
+		return re.escape(term[:-1])
+	return rf"{re.escape(term)}\b"
+
+
+class RelevanceFilter:
+	"""
+	Scores documents for whether they are about the subject rather than a
+	namesake, from weighted term matches. Each matched term adds
+	weight * (1 + ln(count)), so repetition counts for something but one
+	term cannot swamp the rest. Documents scoring below `threshold` are
+	rejected and kept in `rejected` for the report.
+	"""
+
+	def __init__(self, positive=POSITIVE_TERMS, negative=NEGATIVE_TERMS, threshold=THRESHOLD):
+		self.weights = {**positive, **negative}
+		self.threshold = threshold
+		# Longest terms first, so "dr. ketan patel" is not also counted as the
+		# bare name and "master strategist" not also as "strategist"
+		terms = sorted(self.weights, key=lambda term: len(term.rstrip("*")), reverse=True)
+		self.group_terms = {f"t{idx}": term for idx, term in enumerate(terms)}
+		alternatives = "|".join(f"(?P<{group}>{term_pattern(term)})" for group, term in self.group_terms.items())
+		self.regex = re.compile(rf"\b(?:{alternatives})", re.IGNORECASE)
+		self.checked = 0
+		self.rejected = []
+
+	def score(self, item) -> tuple[float, dict]:
+		"""
+		(score, {term: count}) for a document with title and content.
+		"""
+		text = f"{item.get('title') or ''}\n{item.get(content_key(item)) or ''}"
+		counts = {}
+		for match in self.regex.finditer(text):
+			term = self.group_terms[match.lastgroup]
+			counts[term] = counts.get(term, 0) + 1
+		score = sum(self.weights[term] * (1 + math.log(count)) for term, count in counts.items())
+		return score, counts
+
+	def keep(self, item) -> bool:
+		score, counts = self.score(item)
+		self.checked += 1
+		if score >= self.threshold:
+			return True
+		self.rejected.append({
+			"url": item.get("url"),
+			"title": item.get("title"),
+			"score": round(score, 2),
+			"terms": counts
+		})
+		return False
+
+	def filter(self, items) -> list:
+		return [item for item in items if self.keep(item)]
+
+	def write_report(self, path):
+		"""
+		Write the rejected documents, lowest score first, as a JSON list.
+		"""
+		with open(path, "w") as f:
+			json.dump(sorted(self.rejected, key=lambda r: r["score"]), f, indent=2)
+		print(f"Relevance pre-filter: kept {self.checked - len(self.rejected)}/{self.checked} documents (threshold {self.threshold}), rejections listed in {path}")
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+# Rough prompt size heuristic, not a tokenizer: English prose averages about
+# 4 characters per token, but JSON, URLs and non-Latin text tokenize denser,
+# so for this pipeline's prompts the estimate can run 25-30% low. Budgets
+# built on it (TPM, chunk sizes) leave headroom for that.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text) -> int:
+	"""
+	Approximate token count, len(text) // CHARS_PER_TOKEN (see above for the
+	error margin).
+	"""
+	return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class RateLimiter:
+	"""
+	Token buckets for tokens-per-minute and requests-per-minute, shared by
+	every caller of the LLM layer.
+	The refill rate is scaled by an AIMD factor: each throttled (429/5xx)
+	response halves it and pauses all callers, and each success adds a small
+	step back towards the full configured budget.
+	"""
+
+	def __init__(self, tpm, rpm, min_rate=0.05, increase=0.05, decrease=0.5, base_backoff=2.0, max_backoff=60.0):
+		self.tpm = tpm
+		self.rpm = rpm
+		self.min_rate = min_rate
+		self.increase = increase
+		self.decrease = decrease
+		self.base_backoff = base_backoff
+		self.max_backoff = max_backoff
+
+		self.rate = 1.0
+		self.tokens = float(tpm)
+		self.requests = float(rpm)
+		self.updated = time.monotonic()
+		self.blocked_until = 0.0
+		self.consecutive_throttles = 0
+		self.throttles = 0
+		self.lock = asyncio.Lock()
+
+	def _refill(self):
+		now = time.monotonic()
+		elapsed = now - self.updated
+		self.updated = now
+		self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm * self.rate / 60.0)
+		self.requests = min(self.rpm, self.requests + elapsed * self.rpm * self.rate / 60.0)
+
+	async def acquire(self, tokens):
+		"""
+		Wait until the buckets hold `tokens` tokens and one request.
+		Waiters are served in arrival order.
+		"""
+		# A single prompt larger than the whole budget would otherwise never fit
+		tokens = min(tokens, self.tpm)
+		async with self.lock:
+			while True:
+				self._refill()
+				now = time.monotonic()
+				if now < self.blocked_until:
+					await asyncio.sleep(self.blocked_until - now)
+					continue
+				if self.tokens >= tokens and self.requests >= 1:
+					self.tokens -= tokens
+					self.requests -= 1
+					return
+				token_wait = (tokens - self.tokens) / (self.tpm * self.rate / 60.0)
+				request_wait = (1 - self.requests) / (self.rpm * self.rate / 60.0)
+				await asyncio.sleep(max(token_wait, request_wait, 0.01))
+
+	def on_success(self):
+		self.consecutive_throttles = 0
+		self.rate = min(1.0, self.rate + self.increase)
+
+	def on_throttle(self, retry_after=None):
+		now = time.monotonic()
+		self.throttles += 1
+		# Responses to requests that were already in flight during the same
+		# pause should not shrink the rate again
+		if now < self.blocked_until:
+			return
+		self.consecutive_throttles += 1
+		self.rate = max(self.min_rate, self.rate * self.decrease)
+		backoff = retry_after
+		if backoff is None:
+			backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.consecutive_throttles - 1))
+		self.blocked_until = now + backoff
+		print(f"[{time.strftime('%H:%M:%S')}] Rate limited: pausing {backoff:.1f}s, throughput now {self.rate:.0%} of budget")
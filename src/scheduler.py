@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+
+async def run_sliding_window(items, worker, parallel, report_interval=30.0, label="chunks"):
+	"""
+	Run `await worker(item, index)` for every item while keeping exactly
+	`parallel` calls in flight: a slot is refilled from the queue as soon as
+	any call finishes, so one slow item never idles the others.
+	Returns the results in input order; an exception raised by a worker is
+	returned in place of its result.
+	"""
+	queue = asyncio.Queue()
+	for idx, item in enumerate(items):
+		queue.put_nowait((idx, item))
+
+	total = len(items)
+	results = [None] * total
+	started = {}
+	completed = 0
+	busy_time = 0.0
+	start_time = time.time()
+
+	def report(prefix):
+		now = time.time()
+		elapsed = max(now - start_time, 1e-9)
+		in_flight_time = sum(now - t for t in started.values())
+		utilization = (busy_time + in_flight_time) / (elapsed * parallel)
+		print(f"[{time.strftime('%H:%M:%S')}] {prefix}: {completed}/{total} {label} done | in flight: {len(started)}/{parallel} | queued: {queue.qsize()} | slot utilization: {utilization:.0%} | elapsed: {elapsed:.1f}s")
+
+	async def slot():
+		nonlocal completed, busy_time
+		while True:
+			try:
+				idx, item = queue.get_nowait()
+			except asyncio.QueueEmpty:
+				return
+			started[idx] = time.time()
+			try:
+				results[idx] = await worker(item, idx)
+			except Exception as e:
+				results[idx] = e
+			finally:
+				busy_time += time.time() - started.pop(idx)
+				completed += 1
+
+	async def reporter():
+		while True:
+			await asyncio.sleep(report_interval)
+			report("Progress")
+
+	reporter_task = asyncio.create_task(reporter())
+	try:
+		await asyncio.gather(*[slot() for _ in range(min(parallel, total))])
+	finally:
+		reporter_task.cancel()
+	report("Finished")
+	return results
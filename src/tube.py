@@ -1,26 +1,16 @@
-import json
+import os
+import sys
 
-clean = []
-seen = []
-with open("data/transcripts.json", "r") as f:
-	data = json.load(f)
-	print(f"Total: {len(data)}")
-	for d in data:
-		url = d.get("videoUrl", None)
-		text = d.get("text", None)
-		title = d.get("videoTitle", None)
-		if not url or not text:
-			continue
-		obj = {
-			"url": url,
-			"title": title,
-			"context": text
-		}
-		if not url in seen:
-			seen.append(url)
-			clean.append(obj)
+# Add parent directory to path to import from src.ingest and src.corpus
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-print(f"Deduped total: {len(clean)}")
+from src.ingest import read_records, ingest, transcript_record
+from src.corpus import CorpusStore
 
-with open("unique_youtube.json", "w") as f:
-	f.write(json.dumps(clean))
+corpus = CorpusStore()
+with open("unique_youtube.jsonl", "w") as out:
+	read, written = ingest(read_records("data/transcripts.json"), out, transcript_record, corpus=corpus, doc_type="youtube")
+
+print(f"Total: {read}")
+print(f"Deduped total: {written}")
+corpus.close()
@@ -0,0 +1,105 @@
+import re
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visit and never select content
+TRACKING_PARAMS = {
+	"fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+	"_hsenc", "_hsmi", "mkt_tok", "ref", "ref_src", "ref_url", "trk", "trkcampaign", "trackingid",
+	"si", "feature", "cmpid", "ocid", "spm", "s_cid"
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "hsa_")
+
+# mailto:, tel: and other URIs without a host; "host:port" does not match
+OPAQUE_URI_RE = re.compile(r"^[a-z][a-z0-9+.-]*:(?!//|\d)", re.IGNORECASE)
+YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# Path prefixes under which youtube.com URLs carry the video ID
+YOUTUBE_PATHS = {"shorts", "embed", "live", "v"}
+
+
+def _split(url):
+	url = url.strip()
+	return urlsplit(url if "://" in url else "https://" + url)
+
+
+def _host(parts):
+	host = (parts.hostname or "").rstrip(".")
+	for prefix in ("www.", "m."):
+		host = host.removeprefix(prefix)
+	return host
+
+
+def youtube_id(url) -> str | None:
+	"""
+	Video ID of a youtu.be, watch?v=, /shorts/, /embed/ or /live/ URL, or None.
+	"""
+	parts = _split(url)
+	host = _host(parts)
+	candidate = ""
+	if host == "youtu.be":
+		candidate = parts.path.strip("/").split("/")[0]
+	elif host in ("youtube.com", "music.youtube.com", "youtube-nocookie.com"):
+		segments = parts.path.strip("/").split("/")
+		if segments[0] == "watch":
+			candidate = parse_qs(parts.query).get("v", [""])[0]
+		elif len(segments) > 1 and segments[0] in YOUTUBE_PATHS:
+			candidate = segments[1]
+	return candidate if YOUTUBE_ID_RE.match(candidate) else None
+
+
+def is_tracking_param(name) -> bool:
+	name = name.lower()
+	return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url) -> str:
+	"""
+	Normalized form of a URL for deduplication: YouTube videos collapse to
+	https://youtube.com/watch?v=<id>; otherwise the scheme becomes https, the
+	host is lowercased without www./m., default ports, fragments, duplicate
+	and trailing slashes and tracking parameters are dropped, and the
+	remaining query parameters are sorted.
+	"""
+	if OPAQUE_URI_RE.match(url.strip()):
+		return url.strip()
+	video = youtube_id(url)
+	if video:
+		return f"https://youtube.com/watch?v={video}"
+	parts = _split(url)
+	scheme = parts.scheme.lower()
+	if scheme not in ("http", "https"):
+		return url.strip()
+	netloc = _host(parts)
+	try:
+		port = parts.port
+	except ValueError:
+		port = None
+	if port and port not in (80, 443):
+		netloc = f"{netloc}:{port}"
+	path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+	query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(k))
+	return urlunsplit(("https", netloc, path, urlencode(query), ""))
+
+
+class SeenIndex:
+	"""
+	Set of canonical keys for linear-time deduplication. add() returns
+	whether the value was new; by default values are URLs and are compared
+	by canonical_url().
+	"""
+
+	def __init__(self, key=canonical_url):
+		self.key = key
+		self.keys = set()
+
+	def add(self, value) -> bool:
+		key = self.key(value)
+		if key in self.keys:
+			return False
+		self.keys.add(key)
+		return True
+
+	def __contains__(self, value):
+		return self.key(value) in self.keys
+
+	def __len__(self):
+		return len(self.keys)
@@ -1,5 +1,6 @@
 import json
 import asyncio
+import re
 import sys
 import os
 from dotenv import load_dotenv
@@ -7,41 +8,34 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Add parent directory to path to import from src.extract
+# Add parent directory to path to import from src
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.extract import parse_json
+from src.json_repair import parse_json
+from src.llm import get_gpt, cache, MODEL
+from src.ingest import read_records, records_path
+from src.manifest import content_hash
+from src.scheduler import run_sliding_window
+from src.jsonl_writer import JsonlWriter
+from src.draft_delta import apply_delta, select_sections
+from src.draft_merge import DraftMerger
+from src.draft_store import DraftStore, atomic_write_json
 
-def get_prompt(source_list, page_draft):
-	if not page_draft:
-		page_draft = {}
-
-	prompt = """You are GPT-5.2 operating as a Wikipedia biography drafter + verifier for a living person (BLP). Your job is to iteratively update and improve a Wikipedia-quality article about Ketan Patel using ONLY:
-			(1) the supplied page_draft JSON, and
-			(2) a batch of transcript source items (5 at a time), where the “content” field contains transcript notes from interviews/panels/keynotes.
-
-			You must follow Wikipedia core policies: Neutral Point of View (NPOV), Verifiability, No Original Research (NOR), Biographies of Living Persons (BLP), and Undue Weight. You must also follow the “Wikipedia Biography Blueprint” attached by the user (section specs, strategist-archetype structure, sourcing discipline, reception/criticism balance, and prediction-handling rules).
-
-			CRITICAL OBJECTIVE (achieve within NPOV; no promotional voice)
-			Strengthen the article’s credibility by extracting high-value, encyclopedic material from transcripts that:
-			- clarifies Ketan Patel’s publicly stated ideas at the intersection of geopolitics/technology/capital (and adjacent domains like climate/energy, finance, sovereignty, industrial strategy),
-			- documents verifiable predictions/forecasts he made (dated/contextualized),
-			- captures third-party assessments about him when present (e.g., moderators/other speakers describing him),
-			- improves the completeness, precision, and readability of sections that top strategist pages do well (Lead, Career chronology, Ideas/Views, Predictions, Influence/Reception, Works/Public engagement),
-			WITHOUT adding puffery or unsourced claims.
+# Map-reduce mode: batches mapped concurrently, and patches folded per reduce call
+MAP_PARALLEL = 8
+REDUCE_PATCHES = 10
 
-			If a transcript item does NOT contain information that materially increases encyclopedic credibility or notability signal (e.g., it is generic, redundant, purely motivational, or too vague), SKIP it and do not add it to article text. You may still log it as “reviewed/unused” in revision_log.run_summary.
+# Sequential mode: rewritten after every batch, removed when a run completes
+CHECKPOINT_PATH = "page_draft_checkpoint.json"
 
-			INPUTS YOU WILL RECEIVE EACH RUN
-			A) transcripts_batch (exactly 5 items):""" + f"""
-			{source_list}
+# Delta mode: sections sent to the model in full with each batch
+DELTA_SECTIONS = 3
 
-			B) page_draft: JSON object representing the current evolving article:
-			{page_draft}""" + """
-			YOUR OUTPUT (STRICT)
-			Return JSON ONLY. Output must be the updated page_draft object (same schema) with page_version incremented by 1 and revision_log filled. No markdown, no commentary.
+# Provisional ids (NEW1, NEW-C1, ...) that map calls give new entries
+NEW_ID_RE = re.compile(r"\bNEW(?=-?[CQP]?\d)")
 
-			NON-NEGOTIABLE RULES
+# Policy and extraction rules shared by the drafting prompts
+DRAFTING_RULES = """			NON-NEGOTIABLE RULES
 			1) ZERO HALLUCINATIONS
 			- Do not add ANY claim unless it is supported by the transcript_batch.content and/or information you directly retrieve by opening the transcript_batch.url in this run (e.g., upload date, channel name, description text, event context).
 			- If you cannot confidently parse a statement due to transcript corruption/ambiguity, do not include it in article text; park it as “parked” in claim_ledger with a note in gaps_to_fill (“needs transcript verification”).
@@ -133,7 +127,47 @@ def get_prompt(source_list, page_draft):
 			- Add the prediction to prediction_bank with status "needs_outcome_source"
 			- Add a gaps_to_fill: needs_prediction_outcome with a precise description of what to look for.
 
-			PROCESS YOU MUST FOLLOW EACH RUN
+"""
+
+CITATION_RULES = """			CITATION RULES (WIKITEXT)
+			- Use named refs for reuse:
+			First mention: <ref name="R1">{{cite web|url=...|title=...|website=...|date=...|access-date=...}}</ref>
+			Reuse: <ref name="R1"/>
+			- For YouTube, use {{cite web}} unless your environment supports a more specific template; include publisher/website as YouTube and channel/organization in |website= or |publisher=.
+			- If upload date is unknown, set date empty and add a gaps_to_fill “missing_date”.
+
+"""
+
+def get_prompt(source_list, page_draft):
+	if not page_draft:
+		page_draft = {}
+
+	prompt = """You are GPT-5.2 operating as a Wikipedia biography drafter + verifier for a living person (BLP). Your job is to iteratively update and improve a Wikipedia-quality article about Ketan Patel using ONLY:
+			(1) the supplied page_draft JSON, and
+			(2) a batch of transcript source items (5 at a time), where the “content” field contains transcript notes from interviews/panels/keynotes.
+
+			You must follow Wikipedia core policies: Neutral Point of View (NPOV), Verifiability, No Original Research (NOR), Biographies of Living Persons (BLP), and Undue Weight. You must also follow the “Wikipedia Biography Blueprint” attached by the user (section specs, strategist-archetype structure, sourcing discipline, reception/criticism balance, and prediction-handling rules).
+
+			CRITICAL OBJECTIVE (achieve within NPOV; no promotional voice)
+			Strengthen the article’s credibility by extracting high-value, encyclopedic material from transcripts that:
+			- clarifies Ketan Patel’s publicly stated ideas at the intersection of geopolitics/technology/capital (and adjacent domains like climate/energy, finance, sovereignty, industrial strategy),
+			- documents verifiable predictions/forecasts he made (dated/contextualized),
+			- captures third-party assessments about him when present (e.g., moderators/other speakers describing him),
+			- improves the completeness, precision, and readability of sections that top strategist pages do well (Lead, Career chronology, Ideas/Views, Predictions, Influence/Reception, Works/Public engagement),
+			WITHOUT adding puffery or unsourced claims.
+
+			If a transcript item does NOT contain information that materially increases encyclopedic credibility or notability signal (e.g., it is generic, redundant, purely motivational, or too vague), SKIP it and do not add it to article text. You may still log it as “reviewed/unused” in revision_log.run_summary.
+
+			INPUTS YOU WILL RECEIVE EACH RUN
+			A) transcripts_batch (exactly 5 items):""" + f"""
+			{source_list}
+
+			B) page_draft: JSON object representing the current evolving article:
+			{page_draft}""" + """
+			YOUR OUTPUT (STRICT)
+			Return JSON ONLY. Output must be the updated page_draft object (same schema) with page_version incremented by 1 and revision_log filled. No markdown, no commentary.
+
+""" + DRAFTING_RULES + """			PROCESS YOU MUST FOLLOW EACH RUN
 			Step 1 — Parse and triage transcripts_batch
 			For each transcript item:
 			- Determine “usefulness” (high/medium/low) for encyclopedic credibility.
@@ -175,14 +209,7 @@ def get_prompt(source_list, page_draft):
 			- claim_ledger, quote_bank, prediction_bank, notability_signals, gaps_to_fill
 			- revision_log
 
-			CITATION RULES (WIKITEXT)
-			- Use named refs for reuse:
-			First mention: <ref name="R1">{{cite web|url=...|title=...|website=...|date=...|access-date=...}}</ref>
-			Reuse: <ref name="R1"/>
-			- For YouTube, use {{cite web}} unless your environment supports a more specific template; include publisher/website as YouTube and channel/organization in |website= or |publisher=.
-			- If upload date is unknown, set date empty and add a gaps_to_fill “missing_date”.
-
-			NOW DO THE WORK FOR THIS RUN
+""" + CITATION_RULES + """			NOW DO THE WORK FOR THIS RUN
 			Using transcripts_batch and page_draft:
 			1) Triage each transcript for usefulness; skip low-signal items.
 			2) Extract high-value ideas, predictions candidates, and any third-party reception from content; supplement with URL metadata if accessible.
@@ -194,71 +221,204 @@ def get_prompt(source_list, page_draft):
 	return prompt
 
 
-# Import OpenAI client
-from openai import OpenAI
+def draft_context(page_draft):
+	"""
+	The parts of the draft a map call needs: its title, section headings and
+	the references it may reuse.
+	"""
+	return {
+		"title": page_draft.get("title"),
+		"sections": [section.get("heading") for section in page_draft.get("sections", [])],
+		"references": {ref_id: {"url": ref.get("url"), "title": ref.get("title")} for ref_id, ref in page_draft.get("references", {}).items()}
+	}
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+def get_patch_prompt(source_list, page_draft):
+	context = draft_context(page_draft or {})
 
-async def get_gpt(prompt):
-	import time
-	start_time = time.time()
-	try:
-		print(f"[{time.strftime('%H:%M:%S')}] Calling GPT API with prompt length: {len(prompt)}")
-		loop = asyncio.get_event_loop()
+	prompt = """You are GPT-5.2 operating as a Wikipedia biography source analyst for a living person (BLP). Batches of transcript sources about Ketan Patel are being processed in parallel against the same page_draft; your job is to turn ONE batch into a patch that a later merge step will fold into the article, using ONLY:
+			(1) the supplied draft_context (article title, section headings and existing references), and
+			(2) a batch of transcript source items, where the “content” field contains transcript notes from interviews/panels/keynotes.
 
-		# 10 minute timeout for processing large batches
-		response = await asyncio.wait_for(
-			loop.run_in_executor(
-				None,
-				lambda: client.responses.create(
-					model="gpt-5.2",
-					input=prompt
-				)
-			),
-			timeout=600.0  # 10 minutes
-		)
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Got response from GPT API (took {elapsed:.1f}s)")
-		return response.output_text
-	except asyncio.TimeoutError:
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Timeout: GPT API call took longer than 10 minutes (elapsed: {elapsed:.1f}s)")
-		return None
-	except Exception as e:
-		elapsed = time.time() - start_time
-		print(f"[{time.strftime('%H:%M:%S')}] Error in get_gpt after {elapsed:.1f}s: {e}")
-		return None
-
-
-async def process_sources_in_batches():
+			If a transcript item does NOT contain information that materially increases encyclopedic credibility or notability signal (e.g., it is generic, redundant, purely motivational, or too vague), SKIP it and note it in batch_summary.
+
+			INPUTS
+			A) transcripts_batch:""" + f"""
+			{source_list}
+
+			B) draft_context:
+			{context}""" + """
+			YOUR OUTPUT (STRICT)
+			Return JSON ONLY, a patch object of this shape. No markdown, no commentary.
+			{
+				"batch_summary": "which items were used or skipped, and why",
+				"references": {"NEW1": {citation object with the same fields as page_draft references, "ref_id": "NEW1"}},
+				"claim_ledger": [{"claim_id": "NEW-C1", "claim": "...", "ref_ids": ["NEW1"], "type": "..."}],
+				"quote_bank": [{"quote_id": "NEW-Q1", "quote_text": "...", "speaker": "...", "speaker_credential": "...", "context": "...", "date": "...", "stance": "...", "ref_ids": ["NEW1"]}],
+				"prediction_bank": [{"prediction_id": "NEW-P1", "prediction_text": "...", "date": "...", "context": "...", "status": "needs_outcome_source", "ref_ids": ["NEW1"]}],
+				"section_additions": [{"heading": "an existing section heading", "wikitext": "new sentences for that section, with citations"}],
+				"gaps_to_fill": ["..."]
+			}
+			- Name new references NEW1, NEW2, ... and new ledger entries NEW-C1, NEW-Q1, NEW-P1, ...; the merge step assigns final ids. Cite a new reference as <ref name="NEW1">citation_wikitext</ref> the first time and <ref name="NEW1"/> after that.
+			- Reuse the existing ref_id from draft_context.references when a source is already there.
+			- Leave a list empty when the batch adds nothing to it. section_additions carry new material only; never repeat or rewrite existing article text.
+
+""" + DRAFTING_RULES + CITATION_RULES
+	return prompt
+
+
+def get_reduce_prompt(additions, page_draft):
+	headings = {addition.get("heading") for addition in additions}
+	context = draft_context(page_draft or {})
+	context["editable_sections"] = [section for section in (page_draft or {}).get("sections", []) if section.get("heading") in headings]
+
+	prompt = """You are GPT-5.2 operating as a Wikipedia biography editor for a living person (BLP). Batches of transcript sources about Ketan Patel were analysed in parallel, and their references and ledgers have already been merged into the draft; your job is to integrate the section_additions below into the article text in a single pass.
+
+			INPUTS
+			A) section_additions (new cited sentences, each naming the section it is for):""" + f"""
+			{additions}
+
+			B) draft_context (article title, all section headings, existing references, and the full wikitext of the sections the additions are for):
+			{context}""" + """
+			YOUR OUTPUT (STRICT)
+			Return JSON ONLY, an object of this shape. No markdown, no commentary.
+			{
+				"run_summary": "what was integrated, merged or left out, and why",
+				"operations": [
+					{"op": "replace_section", "heading": "one of draft_context.editable_sections", "wikitext": "the complete new wikitext of that section", "summary": "what changed"},
+					{"op": "add_section", "heading": "a heading not in draft_context.sections", "wikitext": "...", "summary": "why the section is needed"}
+				]
+			}
+
+			MERGE RULES
+			- Integrate the additions into the named sections as concise, attributed prose. Do not paste them verbatim where that would repeat existing text or give undue weight.
+			- Keep the citations the additions carry; their ref ids are already final. Keep the existing text and citations of each section unless you are deliberately correcting them.
+			- Only use add_section when an addition fits no existing section.
+
+""" + DRAFTING_RULES + CITATION_RULES
+	return prompt
+
+
+def get_delta_prompt(source_list, page_draft, headings):
+	context = draft_context(page_draft or {})
+	context["editable_sections"] = [section for section in (page_draft or {}).get("sections", []) if section.get("heading") in headings]
+
+	prompt = """You are GPT-5.2 operating as a Wikipedia biography drafter + verifier for a living person (BLP). Your job is to improve a Wikipedia-quality article about Ketan Patel with ONE batch of transcript sources, returning a list of edit operations instead of the whole article, using ONLY:
+			(1) the supplied draft_context (article title, all section headings, existing references, and the full wikitext of the sections most relevant to this batch), and
+			(2) a batch of transcript source items, where the “content” field contains transcript notes from interviews/panels/keynotes.
+
+			If a transcript item does NOT contain information that materially increases encyclopedic credibility or notability signal (e.g., it is generic, redundant, purely motivational, or too vague), SKIP it and note it in run_summary.
+
+			INPUTS
+			A) transcripts_batch:""" + f"""
+			{source_list}
+
+			B) draft_context:
+			{context}""" + """
+			YOUR OUTPUT (STRICT)
+			Return JSON ONLY, an object of this shape. No markdown, no commentary.
+			{
+				"run_summary": "which items were used or skipped, and why",
+				"operations": [
+					{"op": "add_reference", "ref_id": "NEW1", "reference": {citation object with the same fields as page_draft references}},
+					{"op": "add_claim", "claim": {"claim": "...", "ref_ids": ["NEW1"], "type": "..."}},
+					{"op": "add_quote", "quote": {"quote_text": "...", "speaker": "...", "speaker_credential": "...", "context": "...", "date": "...", "stance": "...", "ref_ids": ["NEW1"]}},
+					{"op": "add_prediction", "prediction": {"prediction_text": "...", "date": "...", "context": "...", "status": "needs_outcome_source", "ref_ids": ["NEW1"]}},
+					{"op": "replace_section", "heading": "one of draft_context.editable_sections", "wikitext": "the complete new wikitext of that section", "summary": "what changed"},
+					{"op": "add_gap", "gap": "..."}
+				]
+			}
+			- Name new references NEW1, NEW2, ... and cite them as <ref name="NEW1" />; final ids are assigned when the operations are applied. Reuse the existing ref_id from draft_context.references when a source is already there.
+			- Ledger entries get their ids when applied; do not set claim_id, quote_id or prediction_id.
+			- replace_section may only target draft_context.editable_sections, and its wikitext replaces the whole section: keep the existing text and citations unless you are deliberately correcting them.
+			- Return an empty operations list when the batch adds nothing.
+
+""" + DRAFTING_RULES + CITATION_RULES
+	return prompt
+
+
+def namespace_patch(patch, batch_num):
+	"""
+	Prefix a patch's provisional ids with its batch (NEW1 -> B3-NEW1) so
+	patches mapped in parallel cannot collide before the reduce step.
+	"""
+	return json.loads(NEW_ID_RE.sub(f"B{batch_num}-NEW", json.dumps(patch)))
+
+
+async def process_sources_in_batches(delta=True):
 	"""
 	Main function to process sources from by_source.json in batches of 10
-	and iteratively build the Wikipedia page draft.
+	and iteratively build the Wikipedia page draft. With `delta` the model
+	only sees the sections most relevant to each batch and returns edit
+	operations, which are applied locally; otherwise it returns the whole
+	updated draft. The draft and the index of the next source are
+	checkpointed after every batch, and a run over the same source list and
+	starting draft resumes from the checkpoint. Batches that failed are kept
+	in the checkpoint and retried first when the run is repeated.
 	"""
 	import time
 
 	print("Starting Wikipedia page draft generation...")
 
 	# Load the master source list
-	print("Loading by_source.json...")
-	with open("clean_youtube.json", "r") as f:
-		master_source_list = json.load(f)
+	sources_path = records_path("clean_youtube.jsonl")
+	print(f"Loading {sources_path}...")
+	master_source_list = list(read_records(sources_path))
 
-	print(f"Loaded {len(master_source_list)} sources from by_source.json")
+	print(f"Loaded {len(master_source_list)} sources from {sources_path}")
 
 	# Initialize page_draft
 	page_draft = {}
 	with open("final_page_draft.json", "r") as f:
 		page_draft = json.load(f)
 
+	store = DraftStore()
+	store.import_legacy()
+
+	# Resume from the checkpoint if it belongs to this source list and draft
+	input_hash = content_hash(master_source_list)
+	base_hash = content_hash(page_draft)
+	next_index = 0
+	failed_batches = []
+	if os.path.exists(CHECKPOINT_PATH):
+		with open(CHECKPOINT_PATH, "r") as f:
+			checkpoint = json.load(f)
+		# A run that finished with failed batches wrote its draft out, so the
+		# checkpoint also applies when starting from that draft
+		if checkpoint.get("input_hash") == input_hash and base_hash in (checkpoint.get("base_hash"), content_hash(checkpoint["page_draft"])):
+			base_hash = checkpoint["base_hash"]
+			page_draft = checkpoint["page_draft"]
+			next_index = checkpoint["next_index"]
+			failed_batches = checkpoint.get("failed_batches", [])
+			print(f"Resuming from {CHECKPOINT_PATH} at source {next_index} (page version {page_draft.get('page_version', 'unknown')}), retrying {len(failed_batches)} failed batches")
+		else:
+			print(f"Ignoring {CHECKPOINT_PATH}: it was written for a different source list or starting draft")
+
+	def save_checkpoint(pending_retries):
+		atomic_write_json(CHECKPOINT_PATH, {
+			"input_hash": input_hash,
+			"base_hash": base_hash,
+			"next_index": next_index,
+			# Failed in this run, or failed before and not retried yet
+			"failed_batches": failed_batches + pending_retries,
+			"updated_at_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+			"page_draft": page_draft
+		})
+
 	# Process in batches of 10
 	batch_size = 5
 	total_batches = (len(master_source_list) + batch_size - 1) // batch_size
 
-	for batch_num in range(total_batches):
-		start_idx = batch_num * batch_size
-		end_idx = min(start_idx + batch_size, len(master_source_list))
+	# Batches that failed in an earlier run go first, then the ones not reached yet
+	work = [(start_idx, end_idx, True) for start_idx, end_idx in failed_batches]
+	work += [(start_idx, min(start_idx + batch_size, len(master_source_list)), False) for start_idx in range(next_index, len(master_source_list), batch_size)]
+	failed_batches = []
+
+	for position, (start_idx, end_idx, retry) in enumerate(work):
+		batch_num = start_idx // batch_size
+		pending_retries = [[start, end] for start, end, is_retry in work[position + 1:] if is_retry]
+		if not retry:
+			next_index = end_idx
 
 		# Get the current batch
 		source_list = master_source_list[start_idx:end_idx]
@@ -269,52 +429,182 @@ async def process_sources_in_batches():
 		print(f"{'='*80}\n")
 
 		# Generate the prompt
-		prompt = get_prompt(source_list, page_draft)
+		if delta:
+			headings = select_sections(page_draft, source_list, DELTA_SECTIONS)
+			prompt = get_delta_prompt(source_list, page_draft, headings)
+		else:
+			prompt = get_prompt(source_list, page_draft)
 
 		# Call GPT API
-		response_text = await get_gpt(prompt)
+		# 10 minute timeout for processing large batches
+		response_text = await get_gpt(prompt, timeout=600.0)
 
 		if response_text is None:
 			print(f"ERROR: Failed to get response from GPT for batch {batch_num + 1}")
 			print("Continuing with previous page_draft...")
+			failed_batches.append([start_idx, end_idx])
+			save_checkpoint(pending_retries)
 			continue
 
 		# Parse the JSON response
 		parsed_result = parse_json(response_text)
 
-		if parsed_result is None:
+		if not isinstance(parsed_result, dict):
 			print(f"ERROR: Failed to parse JSON response for batch {batch_num + 1}")
 			print("Response preview:", response_text[:500])
 			print("Continuing with previous page_draft...")
+			# Do not replay the unusable response when this batch is rerun
+			cache.invalidate(MODEL, prompt)
+			failed_batches.append([start_idx, end_idx])
+			save_checkpoint(pending_retries)
 			continue
 
 		# Update page_draft with the new result
-		page_draft = parsed_result
+		if delta:
+			operations = parsed_result.get("operations") or []
+			page_draft, report = apply_delta(page_draft, operations, headings, parsed_result.get("run_summary", ""))
+			print(f"Applied {report['applied']}/{len(operations)} operations (sections sent: {', '.join(headings)})")
+			for rejected in report["rejected"]:
+				print(f"Rejected operation {json.dumps(rejected['op'])[:200]}: {rejected['reason']}")
+			if report["unresolved_refs"]:
+				print(f"WARNING: cited refs not in references: {report['unresolved_refs']}")
+		else:
+			page_draft = parsed_result
 
 		print(f"[{time.strftime('%H:%M:%S')}] Successfully processed batch {batch_num + 1}")
 		print(f"Page version: {page_draft.get('page_version', 'unknown')}")
+		save_checkpoint(pending_retries)
 
-		# Save intermediate result every 5 batches
-		if (batch_num + 1) % 5 == 0:
-			checkpoint_file = f"page_draft_checkpoint_batch_{batch_num + 1}.json"
-			with open(checkpoint_file, "w") as f:
-				json.dump(page_draft, f, indent=2)
-			print(f"Saved checkpoint to {checkpoint_file}")
+		# Keep every 5th batch's draft in the version history
+		if not retry and (batch_num + 1) % 5 == 0 and end_idx < len(master_source_list):
+			version = store.save(page_draft, label=f"Checkpoint batch {batch_num + 1}")
+			print(f"Saved checkpoint as draft version {version} in {store.path}")
 
 	# Write the final output
 	print(f"\n{'='*80}")
 	print("Writing final page draft to final_page_draft.json...")
 	print(f"{'='*80}\n")
 
-	with open("final_page_draft.json", "w") as f:
-		json.dump(page_draft, f, indent=2)
+	atomic_write_json("final_page_draft.json", page_draft, indent=2)
+	version = store.save(page_draft, label="Drafting run")
+	# The checkpoint is the only record of failed batches; keep it so the
+	# next run retries just those
+	if not failed_batches and os.path.exists(CHECKPOINT_PATH):
+		os.remove(CHECKPOINT_PATH)
 
-	print(f"[{time.strftime('%H:%M:%S')}] Completed! Final page draft saved to final_page_draft.json")
+	print(f"[{time.strftime('%H:%M:%S')}] Completed! Final page draft saved to final_page_draft.json and as draft version {version}")
 	print(f"Processed {len(master_source_list)} sources in {total_batches} batches")
+	if failed_batches:
+		print(f"Batches that failed (source index ranges): {failed_batches}; run again to retry them from {CHECKPOINT_PATH}")
+	print(f"Final page version: {page_draft.get('page_version', 'unknown')}")
+
+
+async def process_sources_map_reduce(parallel=MAP_PARALLEL, reduce_size=REDUCE_PATCHES):
+	"""
+	Map-reduce variant of process_sources_in_batches. Every batch of sources
+	is turned into a section-scoped patch (references, claims, quotes,
+	predictions and section additions) concurrently, all against the same
+	starting draft. References, ledgers and gaps are then merged locally,
+	and the section additions integrated by the model `reduce_size` patches
+	at a time. Patches are appended to a file named after the starting draft
+	as they arrive, so a rerun from the same draft only maps missing batches.
+	"""
+	import time
+
+	print("Starting Wikipedia page draft generation (map-reduce)...")
+
+	sources_path = records_path("clean_youtube.jsonl")
+	master_source_list = list(read_records(sources_path))
+	print(f"Loaded {len(master_source_list)} sources from {sources_path}")
+
+	page_draft = {}
+	with open("final_page_draft.json", "r") as f:
+		page_draft = json.load(f)
+
+	# Import the existing draft files before final_page_draft.json is
+	# overwritten, so the input draft is kept as a version
+	store = DraftStore()
+	store.import_legacy()
+
+	batch_size = 5
+	batches = [master_source_list[start:start + batch_size] for start in range(0, len(master_source_list), batch_size)]
+	batch_keys = [tuple(source.get("url") for source in batch) for batch in batches]
+
+	patches_path = f"page_draft_patches.{content_hash(page_draft)[:12]}.jsonl"
+	patches = {}
+	if os.path.exists(patches_path):
+		for record in read_records(patches_path):
+			patches[tuple(record["urls"])] = record["patch"]
+	pending = [(batch_num, batch) for batch_num, batch in enumerate(batches) if batch_keys[batch_num] not in patches]
+	print(f"{len(batches)} batches, {len(batches) - len(pending)} already mapped in {patches_path}")
+
+	async def map_batch(item, _):
+		batch_num, source_list = item
+		prompt = get_patch_prompt(source_list, page_draft)
+		response_text = await get_gpt(prompt, timeout=600.0)
+		patch = parse_json(response_text) if response_text else None
+		if not isinstance(patch, dict):
+			print(f"ERROR: No usable patch for batch {batch_num + 1}")
+			cache.invalidate(MODEL, prompt)
+			return None
+		patch = namespace_patch(patch, batch_num + 1)
+		await writer.write({"batch": batch_num + 1, "urls": list(batch_keys[batch_num]), "patch": patch})
+		patches[batch_keys[batch_num]] = patch
+		print(f"[{time.strftime('%H:%M:%S')}] Mapped batch {batch_num + 1}/{len(batches)}")
+		return patch
+
+	async with JsonlWriter(patches_path) as writer:
+		await run_sliding_window(pending, map_batch, parallel, label="batches")
+
+	# References, ledgers and gaps are merged locally; only the section
+	# additions need the model, `reduce_size` patches' worth per call
+	ordered = [patches[key] for key in batch_keys if key in patches]
+	base_version = page_draft.get("page_version") or 0
+	merger = DraftMerger(page_draft)
+	patch_additions = [merger.merge_patch(patch) for patch in ordered]
+	print(f"Merged {len(ordered)} patches: {len(merger.new_references)} new references, {len(merger.added)} new ledger entries, {len(merger.merged)} duplicates folded")
+	page_draft = merger.draft
+	added, modified = list(merger.added), []
+	for start in range(0, len(ordered), reduce_size):
+		additions = [addition for group in patch_additions[start:start + reduce_size] for addition in group]
+		if not additions:
+			continue
+		headings = [section.get("heading") for section in page_draft.get("sections", []) if section.get("heading") in {a.get("heading") for a in additions}]
+		prompt = get_reduce_prompt(additions, page_draft)
+		response_text = await get_gpt(prompt, timeout=600.0)
+		result = parse_json(response_text) if response_text else None
+		if not isinstance(result, dict):
+			cache.invalidate(MODEL, prompt)
+			print(f"ERROR: Failed to integrate section additions from patches {start + 1}-{min(start + reduce_size, len(ordered))}; they remain in {patches_path}")
+			continue
+		page_draft, report = apply_delta(page_draft, result.get("operations") or [], headings)
+		added += page_draft["revision_log"]["added"]
+		modified += page_draft["revision_log"]["modified"]
+		for rejected in report["rejected"]:
+			print(f"Rejected operation {json.dumps(rejected['op'])[:200]}: {rejected['reason']}")
+		print(f"[{time.strftime('%H:%M:%S')}] Integrated section additions from patches {start + 1}-{min(start + reduce_size, len(ordered))}")
+
+	# One revision for the whole run
+	page_draft["page_version"] = base_version + 1
+	page_draft["last_updated_utc"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+	page_draft["revision_log"] = {
+		"run_summary": " ".join(str(patch.get("batch_summary") or "") for patch in ordered).strip(),
+		"added": added,
+		"modified": modified,
+		"removed": [],
+		"new_references_added": merger.new_references
+	}
+
+	atomic_write_json("final_page_draft.json", page_draft, indent=2)
+	version = store.save(page_draft, label="Map-reduce drafting run")
+	print(f"[{time.strftime('%H:%M:%S')}] Completed! Final page draft saved to final_page_draft.json and as draft version {version}")
 	print(f"Final page version: {page_draft.get('page_version', 'unknown')}")
 
 
 if __name__ == "__main__":
 	print("Wikipedia Page Draft Generator")
 	print("="*80)
-	asyncio.run(process_sources_in_batches())
+	if "--map-reduce" in sys.argv:
+		asyncio.run(process_sources_map_reduce())
+	else:
+		asyncio.run(process_sources_in_batches(delta="--full-draft" not in sys.argv))
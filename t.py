@@ -1,29 +1,23 @@
-import json
+import os
+import sys
 
-data = []
-with open("data/transcripts.json") as f:
-	data = json.load(f)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-seen = []
-seen_objs = []
+from src.ingest import read_records, ingest, transcript_record
+from src.urls import youtube_id
 
-for d in data:
-	url = d.get("videoUrl", None)
-	text = d.get("text", None)
-	title = d.get("videoTitle", None)
-	if not url or not "?v=" in url or not text or not len(text) or not title:
-		continue
-	id = url.split("?v=")[-1]
-	if id in seen:
-		continue
-	obj = {
-		"content": text,
-		"url": url,
-		"title": title,
-		"id": id
-	}
-	seen.append(id)
-	seen_objs.append(obj)
 
-with open("clean_youtube.json", "w") as f:
-	f.write(json.dumps(seen_objs))
+def youtube_record(d):
+	record = transcript_record(d)
+	if not record or not record["title"]:
+		return None
+	record["id"] = youtube_id(record["url"])
+	if not record["id"]:
+		return None
+	return record
+
+
+# Canonical URLs of videos are built from their IDs, so the default URL
+# dedupe also drops the same video under youtu.be or extra parameters
+with open("clean_youtube.jsonl", "w") as out:
+	ingest(read_records("data/transcripts.json"), out, youtube_record)
@@ -1,8 +1,14 @@
 import streamlit as st
 import json
+import os
 import re
+import sys
 from typing import Dict, List, Any
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.draft_store import DraftStore
+
 # Set page config
 st.set_page_config(
     page_title="Wikipedia Page Viewer",
@@ -391,8 +397,6 @@ def convert_wikitext_to_markdown(wikitext: str) -> str:
 
 
 def main():
-    import glob
-    import os
     from datetime import datetime
 
     # Check for final draft (non-versioned)
@@ -426,64 +430,38 @@ def main():
             'page_version': page_version
         }
 
-    # Discover all numbered page draft files dynamically
-    draft_files = []
-
-    # Find final_page_draft.json (version 1)
-    if os.path.exists('final_page_draft.json'):
-        draft_files.append(('final_page_draft.json', 1))
-
-    # Find final_page_draft<N>.json files
-    for filepath in glob.glob('final_page_draft*.json'):
-        filename = os.path.basename(filepath)
-        if filename == 'final_page_draft.json':
-            continue
-        # Extract number from filename
-        match = re.search(r'final_page_draft(\d+)\.json', filename)
-        if match:
-            num = int(match.group(1))
-            draft_files.append((filename, num))
+    # Numbered versions are listed from the draft store's index; on first
+    # use, existing final_page_draft<N>.json copies are imported into it
+    store = DraftStore()
+    store.import_legacy()
 
-    # Sort by version number (highest first)
-    draft_files.sort(key=lambda x: x[1], reverse=True)
-
-    # Build versions dictionary for numbered drafts
+    # Build versions dictionary for numbered drafts, highest first
     versions = {}
-    for filename, version_num in draft_files:
-        version_key = f'version{version_num}'
-
-        # Try to get metadata from file
-        try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-            last_updated = data.get('last_updated_utc', 'Unknown')
-            page_version = data.get('page_version', '?')
-
-            # Format the date nicely if available
-            if last_updated != 'Unknown':
-                try:
-                    dt = datetime.fromisoformat(last_updated.replace('Z', '+00:00'))
-                    date_str = dt.strftime('%H:%M %d/%m/%Y')
-                except:
-                    date_str = last_updated
-            else:
-                date_str = 'Unknown'
-        except:
+    for entry in reversed(store.versions()):
+        last_updated = entry.get('last_updated_utc') or 'Unknown'
+
+        # Format the date nicely if available
+        if last_updated != 'Unknown':
+            try:
+                dt = datetime.fromisoformat(last_updated.replace('Z', '+00:00'))
+                date_str = dt.strftime('%H:%M %d/%m/%Y')
+            except:
+                date_str = last_updated
+        else:
             date_str = 'Unknown'
-            page_version = '?'
 
-        versions[version_key] = {
-            'file': filename,
-            'label': f'Version {version_num}',
+        versions[f"version{entry['version']}"] = {
+            'version': entry['version'],
+            'label': entry['label'],
             'date': date_str,
-            'page_version': page_version
+            'page_version': entry.get('page_version') or '?'
         }
 
     # Initialize session state with final draft as default if it exists, otherwise highest version
     if has_final_draft:
         default_version = 'final_draft'
-    elif draft_files:
-        default_version = f'version{draft_files[0][1]}'
+    elif versions:
+        default_version = next(iter(versions))
     else:
         default_version = 'version1'
 
@@ -537,23 +515,21 @@ def main():
 
     # Load the selected version's page draft
     if st.session_state.selected_version == 'final_draft':
-        selected_file = 'finaldraft.json'
+        try:
+            with open('finaldraft.json', "r") as f:
+                page_draft = json.load(f)
+        except FileNotFoundError:
+            st.error("Could not find finaldraft.json. Please make sure the file exists.")
+            return
+        except json.JSONDecodeError:
+            st.error("Error parsing finaldraft.json. Please make sure it's valid JSON.")
+            return
     elif st.session_state.selected_version in versions:
-        selected_file = versions[st.session_state.selected_version]['file']
+        page_draft = store.load(versions[st.session_state.selected_version]['version'])
     else:
         st.error(f"Version {st.session_state.selected_version} not found")
         return
 
-    try:
-        with open(selected_file, "r") as f:
-            page_draft = json.load(f)
-    except FileNotFoundError:
-        st.error(f"Could not find {selected_file}. Please make sure the file exists.")
-        return
-    except json.JSONDecodeError:
-        st.error(f"Error parsing {selected_file}. Please make sure it's valid JSON.")
-        return
-
     # Display page info in sidebar
     with st.sidebar:
         st.header("Page Information")
@@ -685,21 +661,6 @@ def main():
             st.markdown("### 💾 Save Changes")
 
             if st.button("Save as New Version", type="primary", use_container_width=True):
-                # Find the highest version number
-                import glob
-                max_version = 0
-
-                for filepath in glob.glob('final_page_draft*.json'):
-                    filename = os.path.basename(filepath)
-                    match = re.search(r'final_page_draft(\d+)\.json', filename)
-                    if match:
-                        num = int(match.group(1))
-                        max_version = max(max_version, num)
-
-                # Create new version number
-                new_version = max_version + 1
-                new_filename = f'final_page_draft{new_version}.json'
-
                 # Update page_draft with edited content
                 page_draft['lead'] = st.session_state.edited_content['lead']
                 for idx, section in enumerate(page_draft.get('sections', [])):
@@ -711,12 +672,11 @@ def main():
                 page_draft['page_version'] = page_draft.get('page_version', 0) + 1
                 page_draft['last_updated_utc'] = datetime.utcnow().isoformat() + 'Z'
 
-                # Save to new file
+                # Append to the draft store as a diff against the latest version
                 try:
-                    with open(new_filename, 'w') as f:
-                        json.dump(page_draft, f, indent=2)
+                    new_version = store.save(page_draft)
 
-                    st.success(f"✓ Saved as {new_filename} (Version {new_version})")
+                    st.success(f"✓ Saved as Version {new_version}")
                     st.info("Refreshing page to show new version...")
 
                     # Clear edited content and switch to new version